@@ -0,0 +1,175 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import Counter
+from fastapi import Depends, HTTPException, Response
+from .config import settings
+from .routers.auth import get_current_user
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    def __init__(self, name: str, reason: str, retry_after: int):
+        super().__init__(f"Too many {name} requests ({reason}), try again later")
+        self.retry_after = retry_after
+
+class Ticket:
+    # One admitted request. Held for the request, or handed off to a background job
+    # that releases it when the work is done.
+    def __init__(self, workload: "WorkloadClass", user_id: int):
+        self.workload = workload
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = None
+        self.handed_off = False
+        self.released = False
+
+    @property
+    def queue_wait(self) -> float:
+        return (self.admitted_at or time.monotonic()) - self.enqueued_at
+
+    def server_timing(self) -> str:
+        return f"queue;dur={self.queue_wait * 1000:.1f}"
+
+    def hand_off(self):
+        self.handed_off = True
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.workload.release(self)
+
+class WorkloadClass:
+    # Bounded concurrency for one kind of work. Waiters are admitted in weighted fair
+    # order: each gets a virtual finish tag max(now, user's last tag) + 1/weight, and the
+    # smallest tag goes next, so a user with many requests queued can't starve others.
+
+    def __init__(self, name: str, capacity: int, max_queue: int, max_per_user: int):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.active = 0
+        self.rejected = 0
+        self.wait_ewma = 0.0
+        self.service_ewma = 0.0
+        self._waiters: list = []  # heap of (tag, seq, future, ticket)
+        self._queued = 0
+        self._per_user: Counter = Counter()  # waiting + active
+        self._last_tag: dict[int, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+    def retry_after(self) -> int:
+        # Time for the current queue to drain at the observed service rate
+        return max(1, math.ceil(self.service_ewma * (self._queued + 1) / self.capacity))
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        raise AdmissionRejected(self.name, reason, self.retry_after())
+
+    async def acquire(self, user_id: int, weight: float = 1.0) -> Ticket:
+        if self._per_user[user_id] >= self.max_per_user:
+            self._reject("per-user limit reached")
+        ticket = Ticket(self, user_id)
+        if self.active < self.capacity and not self._queued:
+            self._per_user[user_id] += 1
+            self._start(ticket)
+            return ticket
+        if self._queued >= self.max_queue:
+            self._reject("queue is full")
+
+        tag = max(self._virtual_time, self._last_tag.get(user_id, 0.0)) + 1.0 / weight
+        self._last_tag[user_id] = tag
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (tag, next(self._seq), future, ticket))
+        self._queued += 1
+        self._per_user[user_id] += 1
+        try:
+            await asyncio.wait({future}, timeout=settings.ADMISSION_QUEUE_TIMEOUT)
+        except asyncio.CancelledError:
+            # Client went away while queued; give back a slot granted in the meantime
+            self._abandon(future, ticket)
+            raise
+        if not future.done():
+            self._abandon(future, ticket)
+            self._reject("queue timeout")
+        return ticket
+
+    def _start(self, ticket: Ticket):
+        self.active += 1
+        ticket.admitted_at = time.monotonic()
+        self.wait_ewma += 0.2 * (ticket.queue_wait - self.wait_ewma)
+
+    def _abandon(self, future, ticket: Ticket):
+        if future.done():
+            ticket.release()
+            return
+        future.cancel()
+        self._queued -= 1
+        self._forget(ticket.user_id)
+
+    def _forget(self, user_id: int):
+        self._per_user[user_id] -= 1
+        if self._per_user[user_id] <= 0:
+            del self._per_user[user_id]
+            self._last_tag.pop(user_id, None)
+
+    def release(self, ticket: Ticket):
+        self.active -= 1
+        self._forget(ticket.user_id)
+        self.service_ewma += 0.2 * (time.monotonic() - ticket.admitted_at - self.service_ewma)
+        while self._waiters and self.active < self.capacity:
+            tag, _, future, waiting = heapq.heappop(self._waiters)
+            if future.cancelled():
+                continue
+            self._queued -= 1
+            self._virtual_time = tag
+            self._start(waiting)
+            future.set_result(None)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "queued": self._queued,
+            "rejected": self.rejected,
+            "queue_wait_avg": self.wait_ewma,
+            "service_time_avg": self.service_ewma,
+        }
+
+classes = {
+    "chat": WorkloadClass("chat", settings.ADMISSION_CHAT_CAPACITY, settings.ADMISSION_CHAT_QUEUE, settings.ADMISSION_PER_USER),
+    "image": WorkloadClass("image", settings.ADMISSION_IMAGE_CAPACITY, settings.ADMISSION_IMAGE_QUEUE, settings.ADMISSION_PER_USER),
+    "video": WorkloadClass("video", settings.ADMISSION_VIDEO_CAPACITY, settings.ADMISSION_VIDEO_QUEUE, settings.ADMISSION_PER_USER),
+}
+
+def weight_for(user) -> float:
+    return settings.ADMISSION_USER_WEIGHTS.get(user.username, 1.0)
+
+def admit(name: str):
+    # Dependency holding a slot of the named class for the request (including a streamed
+    # body). Routes that start background work call ticket.hand_off() and give the ticket
+    # to the job, which releases it when finished. Queue wait goes out as Server-Timing.
+    workload = classes[name]
+
+    async def dependency(response: Response, current_user=Depends(get_current_user)):
+        try:
+            ticket = await workload.acquire(current_user.id, weight_for(current_user))
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        # Routes returning their own Response object need to copy this header themselves
+        response.headers["Server-Timing"] = ticket.server_timing()
+        try:
+            yield ticket
+        finally:
+            if not ticket.handed_off:
+                ticket.release()
+
+    return dependency
+
+def stats():
+    return {name: workload.stats() for name, workload in classes.items()}
@@ -10,10 +10,34 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = "sqlite:///./nova_ai.db"
+    SQLITE_PRODUCTION_MODE: bool = False  # WAL journal, synchronous=NORMAL, larger cache and mmap
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    DB_WRITE_BEHIND: bool = False  # batch Chat/VideoLog inserts into grouped transactions
+    DB_WRITE_BEHIND_BATCH: int = 200
+    DB_WRITE_BEHIND_INTERVAL: float = 0.05  # seconds to wait for more rows before committing
 
     # Auth
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_CACHE_ENABLED: bool = True  # cache verified tokens and user principals in-process
+    AUTH_CACHE_TTL: float = 60.0
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    BCRYPT_ROUNDS: int = 12  # changing this rehashes passwords on their next login
+    PASSWORD_HASH_WORKERS: int = 2  # dedicated processes for bcrypt
+    PASSWORD_HASH_QUEUE: int = 16  # waiting hash/verify calls before answering 429
+
+    # Admission control (per workload class; see backend/admission.py)
+    ADMISSION_CHAT_CAPACITY: int = 32  # requests served at once
+    ADMISSION_CHAT_QUEUE: int = 64  # requests waiting before answering 429
+    ADMISSION_IMAGE_CAPACITY: int = 8  # image jobs queued or running at once
+    ADMISSION_IMAGE_QUEUE: int = 16
+    ADMISSION_VIDEO_CAPACITY: int = 4  # video jobs and previews at once
+    ADMISSION_VIDEO_QUEUE: int = 8
+    ADMISSION_PER_USER: int = 4  # one user's waiting + admitted requests per class
+    ADMISSION_QUEUE_TIMEOUT: float = 10.0  # seconds a request may wait for admission
+    ADMISSION_USER_WEIGHTS: dict[str, float] = {}  # username -> fair-share weight, default 1
 
     # Email
     MAIL_USERNAME: str = ""
@@ -25,6 +49,68 @@ class Settings(BaseSettings):
     # AI Config
     OLLAMA_BASE_URL: str = "http://localhost:11434/api"
     DIFFUSION_MODEL_ID: str = "runwayml/stable-diffusion-v1-5"
+    SD_PROFILE: str = "quality"  # "quality", "balanced" or "fast"; see services/model_manager.py
+    SD_WARMUP: bool = False  # load the model (and run one tiny pass) at startup
+    SD_IDLE_UNLOAD_SECONDS: float = 0  # unload the model after this long unused, 0 keeps it resident
+    SD_TORCH_COMPILE: bool = False
+    INFERENCE_SOCKET: str = ""  # Unix socket of a separate inference server; empty runs the model in-process
+    INFERENCE_CONNECT_TIMEOUT: float = 2.0
+    IMAGE_WORKERS: int = 4  # jobs in flight at once; keep >= IMAGE_BATCH_MAX so batches can fill
+    IMAGE_BATCH_MAX: int = 4  # prompts per batched pipeline call
+    IMAGE_BATCH_WAIT: float = 0.25  # seconds to wait for more prompts before running a batch
+    IMAGE_QUEUE_MAX: int = 32
+    IMAGE_JOB_TTL: float = 3600.0  # how long finished jobs stay queryable
+    IMAGE_CACHE_MAX_BYTES: int = 2 * 1024**3  # static/generated size (variants included) before unreferenced files are evicted
+    IMAGE_CACHE_CHECK_EVERY: int = 20  # new files between quota checks
+    IMAGE_VARIANT_WORKERS: int = 1  # threads encoding display/thumbnail variants
+    IMAGE_VARIANT_QUALITY: int = 80
+    IMAGE_THUMBNAIL_SIZE: int = 256
+
+    # Video jobs
+    VIDEO_WORKERS: int = max(1, (os.cpu_count() or 1) // 4)  # concurrent ffmpeg processes; threads are split between them
+    VIDEO_QUEUE_MAX: int = 16
+    VIDEO_JOB_TTL: float = 3600.0  # how long finished jobs stay queryable
+    VIDEO_PARALLEL_SEGMENTS: int = 4  # keyframe-aligned segments encoded at once; 1 disables
+    VIDEO_PARALLEL_MIN_SECONDS: float = 30.0  # shorter clips are encoded in a single pass
+    VIDEO_SPEED_PROFILE: str = "balanced"  # "quality", "balanced" or "fast"; see services/transcode_planner.py
+    VIDEO_MAX_WIDTH: int = 1920  # larger inputs are scaled down before filtering (either orientation)
+    VIDEO_MAX_HEIGHT: int = 1080
+    VIDEO_MAX_UPLOAD_BYTES: int = 2 * 1024**3
+    VIDEO_UPLOAD_TTL: float = 86400.0  # how long an unfinished upload can be resumed
+    VIDEO_PREVIEW_SECONDS: float = 3.0
+    VIDEO_PREVIEW_HEIGHT: int = 360
+    VIDEO_PREVIEW_CONCURRENCY: int = 2
+    VIDEO_PREVIEW_TIMEOUT: float = 20.0
+    VIDEO_OUTPUT_QUOTA_BYTES: int = 20 * 1024**3  # static/videos size before least recently used outputs expire
+    VIDEO_UPLOAD_QUOTA_BYTES: int = 20 * 1024**3
+    VIDEO_UPLOAD_GRACE: float = 900.0  # over quota, an upload no job or preview is using survives this long after its last use
+    VIDEO_PREVIEW_QUOTA_BYTES: int = 1024**3
+
+    # Ollama client
+    OLLAMA_BASE_URLS: list[str] = []  # several backends, e.g. ["http://10.0.0.2:11434/api", ...]; falls back to OLLAMA_BASE_URL
+    OLLAMA_HEALTH_INTERVAL: float = 10.0
+    OLLAMA_MAX_CONNECTIONS: int = 32
+    OLLAMA_KEEPALIVE_TIMEOUT: float = 60.0
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0
+    OLLAMA_READ_TIMEOUT: float = 300.0
+    OLLAMA_MAX_CONCURRENCY: int = 2  # concurrent generations per model on each backend
+    OLLAMA_MODEL_CONCURRENCY: dict[str, int] = {}  # per-model overrides, e.g. {"mistral": 1}
+    OLLAMA_MAX_QUEUE: int = 16  # waiting requests per model before answering 429
+    OLLAMA_QUEUE_TIMEOUT: float = 30.0
+    OLLAMA_KEEP_ALIVE: str = "30m"  # keep models (and their prompt cache) resident between turns
+
+    # Chat context
+    CHAT_CONTEXT_TOKENS: int = 1024  # budget for recent turns sent with each message
+    CHAT_CONTEXT_MAX_TURNS: int = 40
+    CHAT_SUMMARY_MODEL: str = ""  # model used for rolling summaries, defaults to the chat model
+
+    # Chat response cache
+    CHAT_CACHE_ENABLED: bool = True
+    CHAT_CACHE_MAX_ENTRIES: int = 1000
+    CHAT_CACHE_TTL: float = 3600.0
+    CHAT_CACHE_SEMANTIC: bool = False  # needs numpy and an embedding model pulled in Ollama
+    CHAT_CACHE_EMBED_MODEL: str = "nomic-embed-text"
+    CHAT_CACHE_SIMILARITY: float = 0.95
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,84 @@
+# Standalone image inference process. It owns the Stable Diffusion pipeline (or the
+# mock fallback) and serves generations to any number of web workers over a Unix
+# socket, so model memory and batching are shared instead of per worker.
+# Run from the nova_ai directory: python -m backend.inference_server
+# and start the web app with INFERENCE_SOCKET pointing at the same path.
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .config import settings
+from .services import image_service
+from .services.image_service import GenerationCancelled
+from .services.model_manager import manager
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix="inference-worker")
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message).encode() + b"\n"
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+
+    def on_step(step, total_steps):
+        if cancelled.is_set():
+            raise GenerationCancelled()
+        loop.call_soon_threadsafe(writer.write, _encode({"event": "step", "step": step, "total": total_steps}))
+
+    async def watch_disconnect():
+        # The client sends nothing after its request, so EOF means it went away
+        await reader.read()
+        cancelled.set()
+
+    watcher = None
+    try:
+        request = json.loads(await reader.readline())
+        watcher = asyncio.create_task(watch_disconnect())
+        url, cache_hit, model, params = await loop.run_in_executor(
+            _executor, image_service.render_local, request["prompt"], int(request["seed"]), on_step,
+        )
+        reply = {"event": "done", "url": url, "cached": cache_hit, "model": model, "params": params}
+    except GenerationCancelled:
+        reply = {"event": "error", "message": "Generation cancelled", "cancelled": True}
+    except Exception as e:
+        logger.error(f"Inference request failed: {e}")
+        reply = {"event": "error", "message": str(e)}
+
+    if watcher is not None:
+        watcher.cancel()
+    try:
+        if not cancelled.is_set():
+            writer.write(_encode(reply))
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(path: str):
+    if os.path.exists(path):
+        os.remove(path)  # left over from a previous run
+    server = await asyncio.start_unix_server(handle, path=path)
+    os.chmod(path, 0o660)
+    logger.info(f"Inference server listening on {path} (model: {settings.DIFFUSION_MODEL_ID}, profile: {settings.SD_PROFILE})")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    if not settings.INFERENCE_SOCKET:
+        raise SystemExit("Set INFERENCE_SOCKET to the socket path to listen on")
+    # Load before accepting work; without the diffusers stack this serves mock images
+    manager.warmup()
+    try:
+        asyncio.run(serve(settings.INFERENCE_SOCKET))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
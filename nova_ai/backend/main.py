@@ -2,16 +2,52 @@ from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from .routers import auth, chat, image, video, otp
-from .database import engine, Base
+from .services.ollama_client import client as ollama_client
+from .write_behind import writer as write_behind_writer
+from .services import password_service, image_variants, user_cache
+from .services.response_cache import cache as response_cache
+from .services.image_jobs import jobs as image_jobs
+from .services.video_jobs import jobs as video_jobs
+from .services.model_manager import manager as sd_model
+from .database import engine, async_engine, Base
 from .config import settings
+from . import metrics, admission
+import asyncio
 import os
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+# create_all skips new indexes on tables that already exist
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 
-app = FastAPI(title=settings.APP_NAME, debug=settings.DEBUG)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ollama_client.start()
+    password_service.start()
+    image_jobs.start()
+    video_jobs.start()
+    if settings.SD_WARMUP and not settings.INFERENCE_SOCKET:
+        # In the background so the server accepts requests meanwhile; jobs wait for the load
+        asyncio.get_running_loop().run_in_executor(None, sd_model.warmup)
+    if settings.DB_WRITE_BEHIND:
+        write_behind_writer.start()
+    yield
+    await image_jobs.stop()
+    await video_jobs.stop()
+    await run_in_threadpool(image_variants.shutdown)
+    await ollama_client.close()
+    await run_in_threadpool(password_service.shutdown)
+    # Flush queued chat/video logs before exiting
+    await run_in_threadpool(write_behind_writer.stop)
+    await async_engine.dispose()
+
+app = FastAPI(title=settings.APP_NAME, debug=settings.DEBUG, lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -22,6 +58,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the timings include the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Determine base path relative to this file
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
@@ -45,6 +84,68 @@ app.include_router(chat.router)
 app.include_router(image.router)
 app.include_router(video.router)
 
+@metrics.register
+def runtime_metrics():
+    # Read from the existing stats helpers at scrape time; nothing extra on the request path
+    chat_cache = response_cache.stats()
+    auth_cache = user_cache.stats()
+    ollama = ollama_client.stats()
+    workloads = admission.stats()
+    return [
+        ("nova_job_queue_depth", "Jobs waiting for a worker", "gauge", [
+            ({"queue": "image"}, image_jobs.queue_depth()),
+            ({"queue": "video"}, video_jobs.queue_depth()),
+        ]),
+        ("nova_password_operations_pending", "Password hash/verify calls running or queued", "gauge", [
+            ({}, password_service.pending()),
+        ]),
+        ("nova_ollama_waiting", "Requests waiting for an Ollama model slot", "gauge", [
+            ({"model": model}, info["waiting"]) for model, info in ollama["models"].items()
+        ]),
+        ("nova_ollama_backend_in_flight", "Requests in flight per Ollama backend", "gauge", [
+            ({"backend": b["url"]}, b["in_flight"]) for b in ollama["backends"]
+        ]),
+        ("nova_ollama_backend_healthy", "Whether the Ollama backend passed its last health check", "gauge", [
+            ({"backend": b["url"]}, int(b["healthy"])) for b in ollama["backends"]
+        ]),
+        ("nova_admission_active", "Admitted requests per workload class", "gauge", [
+            ({"workload": name}, w["active"]) for name, w in workloads.items()
+        ]),
+        ("nova_admission_queued", "Requests waiting for admission per workload class", "gauge", [
+            ({"workload": name}, w["queued"]) for name, w in workloads.items()
+        ]),
+        ("nova_admission_rejected_total", "Requests rejected by admission control", "counter", [
+            ({"workload": name}, w["rejected"]) for name, w in workloads.items()
+        ]),
+        ("nova_cache_hits_total", "In-memory cache hits", "counter", [
+            ({"cache": "chat_exact"}, chat_cache["hits"]["exact"]),
+            ({"cache": "chat_semantic"}, chat_cache["hits"]["semantic"]),
+            ({"cache": "auth_token"}, auth_cache["tokens"]["hits"]),
+            ({"cache": "auth_principal"}, auth_cache["principals"]["hits"]),
+        ]),
+        ("nova_cache_misses_total", "In-memory cache misses", "counter", [
+            ({"cache": "chat"}, chat_cache["misses"]),
+            ({"cache": "auth_token"}, auth_cache["tokens"]["misses"]),
+            ({"cache": "auth_principal"}, auth_cache["principals"]["misses"]),
+        ]),
+        ("nova_cache_hit_ratio", "Hit ratio since startup", "gauge", [
+            ({"cache": "chat"}, chat_cache["hit_ratio"]),
+            ({"cache": "auth_token"}, ratio(auth_cache["tokens"])),
+            ({"cache": "auth_principal"}, ratio(auth_cache["principals"])),
+        ]),
+        ("nova_image_variant_bytes_saved", "Bytes saved by serving resized image variants", "gauge", [
+            ({}, image_variants.stats()["bytes_saved"]),
+        ]),
+    ]
+
+def ratio(stats: dict) -> float:
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else 0.0
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -43,18 +43,31 @@ class Chat(Base):
 
     user = relationship("User", back_populates="chats")
 
+    __table_args__ = (Index("ix_chats_user_id_timestamp", "user_id", "timestamp"),)
+
+class ChatSummary(Base):
+    __tablename__ = "chat_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, index=True)
+    summary = Column(Text, default="")
+    last_chat_id = Column(Integer, default=0) # newest Chat row folded into the summary
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class Image(Base):
     __tablename__ = "images"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     prompt = Column(String)
-    image_path = Column(String)
+    image_path = Column(String, index=True) # content-addressed, shared by identical requests
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     parameters = Column(Text) # JSON string for params
 
     user = relationship("User", back_populates="images")
 
+    __table_args__ = (Index("ix_images_user_id_created_at", "user_id", "created_at"),)
+
 class VideoLog(Base):
     __tablename__ = "video_logs"
 
@@ -62,8 +75,10 @@ class VideoLog(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     command = Column(String)
     input_file = Column(String)
-    output_file = Column(String)
-    status = Column(String) # 'processing', 'completed', 'failed'
+    output_file = Column(String, index=True)
+    status = Column(String) # 'queued', 'processing', 'completed', 'failed', 'cancelled', 'expired'
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="video_logs")
+
+    __table_args__ = (Index("ix_video_logs_user_id_timestamp", "user_id", "timestamp"),)
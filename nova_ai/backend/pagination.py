@@ -0,0 +1,27 @@
+from sqlalchemy import select, or_, and_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def keyset_query(model, columns, order_column, user_id: int, before: int | None, limit: int):
+    # Newest-first page of a user's rows that come strictly after the row with id `before`.
+    # Served by the (user_id, <time column>) index, so cost does not grow with history size.
+    stmt = select(*columns).where(model.user_id == user_id)
+    if before is not None:
+        cursor_time = (
+            select(order_column)
+            .where(model.id == before, model.user_id == user_id)
+            .scalar_subquery()
+        )
+        # Compare against the stored value so timestamps sharing the same second stay ordered by id
+        stmt = stmt.where(or_(
+            order_column < cursor_time,
+            and_(order_column == cursor_time, model.id < before),
+        ))
+    # One extra row tells us whether another page exists
+    return stmt.order_by(order_column.desc(), model.id.desc()).limit(limit + 1)
+
+def to_page(rows, limit: int):
+    items = [dict(row._mapping) for row in rows[:limit]]
+    next_before = items[-1]["id"] if len(rows) > limit else None
+    return {"items": items, "next_before": next_before}
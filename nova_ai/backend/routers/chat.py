@@ -1,24 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import aclosing
+from ..database import get_async_db, AsyncSessionLocal
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from ..models import User, Chat
 from ..services import ollama_service
+from ..services.ollama_client import OllamaBusyError
+from ..services.response_cache import cache as response_cache
 from .auth import get_current_user
+from ..admission import admit, Ticket
 from pydantic import BaseModel
+import json
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 class ChatRequest(BaseModel):
     message: str
     model: str = "tinyllama"
+    no_cache: bool = False  # skip cached answers and always generate
+
+def busy_exception(e: OllamaBusyError):
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
 @router.post("/")
-async def chat(request: ChatRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    response = await ollama_service.chat_with_ollama(db, current_user, request.message, request.model)
+async def chat(request: ChatRequest, ticket: Ticket = Depends(admit("chat")), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    try:
+        response = await ollama_service.chat_with_ollama(db, current_user, request.message, request.model, bypass_cache=request.no_cache)
+    except OllamaBusyError as e:
+        raise busy_exception(e)
     if "error" in response:
         raise HTTPException(status_code=500, detail=response["error"])
     return response
 
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, ticket: Ticket = Depends(admit("chat")), current_user: User = Depends(get_current_user)):
+    # The admission slot is held until the stream ends
+    # Reject up front while we can still send a proper status code
+    # Short-lived session: a request-scoped one would stay open until the stream ends
+    try:
+        async with AsyncSessionLocal() as db:
+            messages, cached = await ollama_service.prepare_stream(db, current_user.id, request.message, request.model, bypass_cache=request.no_cache)
+    except OllamaBusyError as e:
+        raise busy_exception(e)
+
+    async def event_stream():
+        # On client disconnect the response task is cancelled; aclosing() then
+        # releases the upstream Ollama connection and stores the partial reply.
+        async with aclosing(ollama_service.stream_chat_with_ollama(current_user.id, request.message, request.model, messages, cached)) as events:
+            async for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Server-Timing": ticket.server_timing()},
+    )
+
+@router.get("/cache/stats")
+def get_cache_stats(current_user: User = Depends(get_current_user)):
+    return response_cache.stats()
+
 @router.get("/history")
-def get_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return ollama_service.get_chat_history(db, current_user)
+async def get_history(
+    before: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await ollama_service.get_chat_history(db, current_user, before, limit)
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Response
 from sqlalchemy.orm import Session
 from ..database import get_db
+from ..pagination import keyset_query, to_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from ..models import User, Image
-from ..services import image_service
+from ..services.image_jobs import jobs as image_jobs, JobQueueFullError
+from ..services import image_service, image_variants
 from .auth import get_current_user
-from pydantic import BaseModel
+from ..admission import admit, Ticket
 from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,17 +17,58 @@ router = APIRouter(prefix="/image", tags=["image"])
 
 class ImageRequest(BaseModel):
     prompt: str
+    seed: int | None = None  # defaults to one derived from the prompt, so repeats are served from cache
 
-@router.post("/generate")
-async def generate_image(request: ImageRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@router.post("/generate", status_code=202)
+async def generate_image(
+    request: ImageRequest,
+    response: Response,
+    ticket: Ticket = Depends(admit("image")),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # An image already on disk is answered right away (200); anything else is queued (202)
+    # and /image/jobs/{id} is polled for the result
+    image = await run_in_threadpool(image_service.generate_cached, db, current_user, request.prompt, request.seed)
+    if image is not None:
+        response.status_code = 200
+        return {"status": "completed", "image_id": image.id, "image_url": image.image_path, "cached": True}
     try:
-        # Run blocking image generation in threadpool
-        image = await run_in_threadpool(image_service.generate_image, db, current_user, request.prompt)
-        return {"image_url": image.image_path, "prompt": image.prompt, "id": image.id}
-    except Exception as e:
-        logger.error(f"Image generation failed: {e}")
-        raise HTTPException(status_code=500, detail="Image generation failed")
+        job = image_jobs.submit(current_user, request.prompt, request.seed)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    # The job keeps the admission slot until it finishes
+    job.admission = ticket
+    ticket.hand_off()
+    return {"job_id": job.id, "status": job.status}
+
+def get_own_job(job_id: str, current_user: User):
+    job = image_jobs.get(job_id)
+    if job is None or job.user.id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    return get_own_job(job_id, current_user).to_dict()
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = get_own_job(job_id, current_user)
+    image_jobs.cancel(job)
+    return job.to_dict()
 
 @router.get("/history")
-def get_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Image).filter(Image.user_id == current_user.id).order_by(Image.created_at.desc()).all()
+def get_history(
+    before: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    columns = (Image.id, Image.prompt, Image.image_path, Image.created_at)
+    rows = db.execute(keyset_query(Image, columns, Image.created_at, current_user.id, before, limit)).all()
+    page = to_page(rows, limit)
+    # Thumbnails for the grid; image_path stays the full-size original
+    for item in page["items"]:
+        item.update(image_variants.urls_for(item["image_path"]))
+    return page
@@ -1,21 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
 from ..models import User
 from ..services import otp_service
+from .auth import get_password_hash
 from pydantic import BaseModel
-from passlib.context import CryptContext
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/otp", tags=["otp"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
 class ForgotPasswordRequest(BaseModel):
     email: str
 
@@ -29,14 +25,15 @@ class ResetPasswordRequest(BaseModel):
     new_password: str
 
 @router.post("/forgot-password")
-async def forgot_password(request: ForgotPasswordRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
+async def forgot_password(request: ForgotPasswordRequest, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == request.email))
+    user = result.scalars().first()
     # Don't reveal user existence for security, but log it
     if not user:
         logger.info(f"Forgot password requested for non-existent email: {request.email}")
         return {"message": "If account exists, an OTP has been sent."}
 
-    otp = otp_service.create_otp(db, user)
+    otp = await otp_service.create_otp(db, user)
 
     # Send email in background
     background_tasks.add_task(
@@ -49,13 +46,14 @@ async def forgot_password(request: ForgotPasswordRequest, background_tasks: Back
     return {"message": "OTP sent to email"}
 
 @router.post("/verify")
-def verify_otp(request: VerifyOTPRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
+async def verify_otp(request: VerifyOTPRequest, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == request.email))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=400, detail="Invalid request")
 
     # Check if OTP is valid but do NOT consume it yet.
-    is_valid = otp_service.verify_otp(db, user, request.otp, consume=False)
+    is_valid = await otp_service.verify_otp(db, user, request.otp, consume=False)
 
     if not is_valid:
         raise HTTPException(status_code=400, detail="Invalid or expired OTP")
@@ -63,20 +61,21 @@ def verify_otp(request: VerifyOTPRequest, db: Session = Depends(get_db)):
     return {"message": "OTP verified successfully"}
 
 @router.post("/reset-password")
-def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
+async def reset_password(request: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == request.email))
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=400, detail="User not found")
 
     # Verify AND Consume OTP
-    is_valid = otp_service.verify_otp(db, user, request.otp, consume=True)
+    is_valid = await otp_service.verify_otp(db, user, request.otp, consume=True)
 
     if not is_valid:
         raise HTTPException(status_code=400, detail="Invalid or expired OTP")
 
     # Reset password
-    hashed_password = get_password_hash(request.new_password)
+    hashed_password = await get_password_hash(request.new_password)
     user.hashed_password = hashed_password
-    db.commit()
+    await db.commit()  # the user_cache update hook drops the cached principal
 
     return {"message": "Password reset successfully"}
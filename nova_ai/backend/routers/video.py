@@ -1,52 +1,160 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Query, Request, Response
 from sqlalchemy.orm import Session
 from ..database import get_db
+from ..pagination import keyset_query, to_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from ..models import User, VideoLog
-from ..services import video_service
+from ..services import video_service, video_store, upload_service
+from ..services.upload_service import UploadTooLargeError, UploadOffsetError
+from ..services.video_jobs import jobs as video_jobs, JobQueueFullError
 from .auth import get_current_user
+from ..admission import admit, Ticket
+from .. import metrics
 from fastapi.concurrency import run_in_threadpool
-import shutil
-import os
-import uuid
+from pydantic import BaseModel
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/video", tags=["video"])
 
-@router.post("/process")
+def busy_exception(e: JobQueueFullError):
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+class UploadCreate(BaseModel):
+    filename: str
+    size: int
+
+def too_large_exception(e: UploadTooLargeError):
+    return HTTPException(status_code=413, detail=str(e))
+
+def get_own_upload(upload_id: str, current_user: User):
+    session = upload_service.get(upload_id, current_user.id)
+    if session is None:
+        # Sessions live in memory for VIDEO_UPLOAD_TTL; the client has to start over
+        raise HTTPException(status_code=404, detail="Upload session expired or not found, start a new upload")
+    return session
+
+@router.post("/uploads", status_code=201)
+async def create_upload(request: UploadCreate, current_user: User = Depends(get_current_user)):
+    # Resumable uploads: create, then PUT the bytes in one or more chunks at the current offset
+    try:
+        session = await run_in_threadpool(upload_service.create, current_user.id, request.filename, request.size)
+    except UploadTooLargeError as e:
+        raise too_large_exception(e)
+    return session.to_dict()
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str, current_user: User = Depends(get_current_user)):
+    return get_own_upload(upload_id, current_user).to_dict()
+
+@router.put("/uploads/{upload_id}")
+async def put_upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0), current_user: User = Depends(get_current_user)):
+    session = get_own_upload(upload_id, current_user)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and offset + int(content_length) > session.size:
+        raise HTTPException(status_code=413, detail="Chunk runs past the declared upload size")
+    try:
+        await upload_service.append(session, offset, request.stream())
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.offset})
+    except UploadTooLargeError as e:
+        raise too_large_exception(e)
+    if session.upload is not None:
+        await video_jobs.enforce_quota()
+    return session.to_dict()
+
+@router.post("/process", status_code=202)
 async def process_video(
+    response: Response,
     prompt: str = Form(...),
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    upload: str | None = Form(None),
+    preview: bool = Form(False),
+    ticket: Ticket = Depends(admit("video")),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    try:
-        # Save uploaded file
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        upload_dir = os.path.join(base_dir, "static", "videos", "uploads")
-        os.makedirs(upload_dir, exist_ok=True)
-        file_ext = os.path.splitext(file.filename)[1]
-        if not file_ext:
-            file_ext = ".mp4" # Default extension if missing
+    # Takes either a finished upload from /video/uploads or a small file in the form itself.
+    # Queues the transcode and returns immediately; poll /video/jobs/{id} for progress.
+    # preview=true instead renders the first few seconds at low resolution and returns it directly.
+    if upload is not None:
+        filepath = await run_in_threadpool(upload_service.resolve, upload)
+        if filepath is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+    elif file is not None:
+        try:
+            filepath = await run_in_threadpool(upload_service.resolve, await upload_service.store(current_user.id, file))
+        except UploadTooLargeError as e:
+            raise too_large_exception(e)
+    else:
+        raise HTTPException(status_code=400, detail="Provide a file or an upload")
 
-        filename = f"{uuid.uuid4()}{file_ext}"
-        filepath = os.path.join(upload_dir, filename)
+    if preview:
+        try:
+            preview_url = await video_service.render_preview(filepath, prompt)
+        except TimeoutError:
+            raise HTTPException(status_code=504, detail="Preview took too long")
+        if preview_url is None:
+            raise HTTPException(status_code=500, detail="Preview failed")
+        await video_jobs.enforce_quota()
+        # The upload name lets the client start the full render without uploading again
+        response.status_code = 200
+        return {"preview_url": preview_url, "upload": os.path.basename(filepath)}
 
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    # A render of the same bytes with the same effect and settings is reused as-is
+    cache_key = await run_in_threadpool(video_store.cache_key, filepath, video_service.parse_prompt(prompt))
+    output_url = video_store.lookup(cache_key)
+    metrics.cache_lookups.inc("video", "miss" if output_url is None else "hit")
+    # Only a miss needs a worker, so a full queue never turns away a cached answer
+    if output_url is None and not video_jobs.has_capacity():
+        raise busy_exception(JobQueueFullError(video_jobs.kind))
+    try:
+        if output_url is not None:
+            log = await run_in_threadpool(video_service.create_log, db, current_user, filepath, prompt, "completed", output_url)
+            return {"id": log.id, "status": "completed", "output_url": output_url, "cached": True}
+        log = await run_in_threadpool(video_service.create_log, db, current_user, filepath, prompt)
+    except Exception as e:
+        logger.error(f"Video log error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Process video synchronously (blocking but safe in threadpool)
-        log = await run_in_threadpool(video_service.process_video, db, current_user, filepath, prompt)
+    try:
+        job = video_jobs.submit(current_user, log.id, filepath, prompt, cache_key)
+    except JobQueueFullError as e:
+        await video_service.update_log(log.id, status="failed")
+        raise busy_exception(e)
+    # The job keeps the admission slot until it finishes
+    job.admission = ticket
+    ticket.hand_off()
+    return {"job_id": job.id, "id": log.id, "status": job.status}
 
-        if log.status == "failed":
-            raise HTTPException(status_code=500, detail="Video processing failed")
+def get_own_job(job_id: str, current_user: User):
+    job = video_jobs.get(job_id)
+    if job is None or job.user.id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-        return {"output_url": log.output_file, "status": log.status, "id": log.id}
-    except Exception as e:
-        logger.error(f"Video processing error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    return get_own_job(job_id, current_user).to_dict()
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = get_own_job(job_id, current_user)
+    was_queued = job.status == "queued"
+    video_jobs.cancel(job)
+    if was_queued:
+        # Never reaches a worker, so record the cancellation here; running jobs record their own
+        await video_service.update_log(job.log_id, status="cancelled")
+    return job.to_dict()
 
 @router.get("/history")
-def get_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(VideoLog).filter(VideoLog.user_id == current_user.id).order_by(VideoLog.timestamp.desc()).all()
+def get_history(
+    before: int | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    columns = (VideoLog.id, VideoLog.command, VideoLog.output_file, VideoLog.status, VideoLog.timestamp)
+    rows = db.execute(keyset_query(VideoLog, columns, VideoLog.timestamp, current_user.id, before, limit)).all()
+    return to_page(rows, limit)
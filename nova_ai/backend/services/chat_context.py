@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models import Chat, ChatSummary
+from .ollama_client import client
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant.\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages:\n{turns}\n\n"
+    "Rewrite the summary to include the new messages. Keep names, facts and open questions. "
+    "Answer with the summary only, in at most 200 words."
+)
+
+# user_id -> [lock, holders and waiters]; the entry goes when the last of them is done
+_summary_locks: dict[int, list] = {}
+_background_tasks: set[asyncio.Task] = set()
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text, plus per-message overhead
+    return len(text) // 4 + 4
+
+async def _get_summary(db: AsyncSession, user_id: int):
+    result = await db.execute(select(ChatSummary).where(ChatSummary.user_id == user_id))
+    return result.scalars().first()
+
+async def _unsummarized_turns(db: AsyncSession, user_id: int, after_id: int, limit: int | None = None):
+    # Newest first, bounded so long histories never turn into large scans
+    result = await db.execute(
+        select(Chat)
+        .where(Chat.user_id == user_id, Chat.id > after_id)
+        .order_by(Chat.id.desc())
+        .limit(limit or settings.CHAT_CONTEXT_MAX_TURNS)
+    )
+    return result.scalars().all()
+
+async def _turns_to_fold(db: AsyncSession, user_id: int, after_id: int, before_id: int):
+    # Oldest first from the summary's position, so no row is ever skipped
+    result = await db.execute(
+        select(Chat)
+        .where(Chat.user_id == user_id, Chat.id > after_id, Chat.id < before_id)
+        .order_by(Chat.id)
+        .limit(settings.CHAT_CONTEXT_MAX_TURNS)
+    )
+    batch = []
+    budget = settings.CHAT_CONTEXT_TOKENS
+    for turn in result.scalars().all():
+        cost = estimate_tokens(turn.content or "")
+        if batch and cost > budget:
+            break
+        budget -= cost
+        batch.append(turn)
+    return batch
+
+async def build_messages(db: AsyncSession, user_id: int, message: str):
+    # Rolling summary of older turns + as many recent turns as fit the token budget + the new message.
+    # The summary only changes in batches, so the start of the prompt stays stable between
+    # turns and Ollama can reuse its cached prompt evaluation while the model is kept alive.
+    summary = await _get_summary(db, user_id)
+    after_id = summary.last_chat_id if summary else 0
+
+    budget = settings.CHAT_CONTEXT_TOKENS - estimate_tokens(message)
+    recent = []
+    for turn in await _unsummarized_turns(db, user_id, after_id):
+        cost = estimate_tokens(turn.content or "")
+        if cost > budget:
+            break
+        budget -= cost
+        recent.append({"role": turn.role, "content": turn.content})
+    recent.reverse()
+
+    messages = []
+    if summary and summary.summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary.summary}"})
+    messages.extend(recent)
+    messages.append({"role": "user", "content": message})
+    return messages
+
+async def _summarize(model: str, summary: str, turns) -> str:
+    lines = "\n".join(f"{t.role}: {t.content}" for t in turns)
+    payload = {
+        "model": settings.CHAT_SUMMARY_MODEL or model,
+        "prompt": SUMMARY_PROMPT.format(summary=summary or "(empty)", turns=lines),
+        "stream": False,
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+    }
+    async with client.post("/generate", payload) as response:
+        if response.status != 200:
+            raise RuntimeError(f"Ollama returned status {response.status}")
+        result = await response.json()
+    return result.get("response", "").strip()
+
+@asynccontextmanager
+async def _summary_lock(user_id: int):
+    # One summary update per user at a time. Only touched from the event loop, so the
+    # reference count needs no further locking.
+    entry = _summary_locks.setdefault(user_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _summary_locks[user_id]
+
+async def update_summary(user_id: int, model: str):
+    # Once unsummarized turns exceed the turn window or the token budget, fold everything but
+    # the newest turns (half of each limit) into the summary. Folding goes in id order from
+    # the summary's position, in batches, and only the new turns are sent, never the whole history.
+    async with _summary_lock(user_id), AsyncSessionLocal() as db:
+        try:
+            summary = await _get_summary(db, user_id)
+            after_id = summary.last_chat_id if summary else 0
+            max_turns = settings.CHAT_CONTEXT_MAX_TURNS
+            turns = await _unsummarized_turns(db, user_id, after_id, max_turns + 1)
+            over_turns = len(turns) > max_turns
+            over_tokens = sum(estimate_tokens(t.content or "") for t in turns) > settings.CHAT_CONTEXT_TOKENS
+            if not (over_turns or over_tokens):
+                return
+
+            keep_budget = settings.CHAT_CONTEXT_TOKENS // 2
+            keep = 0
+            for turn in turns:
+                cost = estimate_tokens(turn.content or "")
+                if cost > keep_budget or keep >= max_turns // 2:
+                    break
+                keep_budget -= cost
+                keep += 1
+            # Fold everything older than the oldest kept turn
+            before_id = turns[keep - 1].id if keep else turns[0].id + 1
+
+            while True:
+                batch = await _turns_to_fold(db, user_id, after_id, before_id)
+                if not batch:
+                    break
+                text = await _summarize(model, summary.summary if summary else "", batch)
+                if summary is None:
+                    summary = ChatSummary(user_id=user_id)
+                    db.add(summary)
+                summary.summary = text
+                summary.last_chat_id = after_id = batch[-1].id
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to update chat summary for user {user_id}: {e}")
+
+def schedule_summary_update(user_id: int, model: str):
+    # Runs after the reply has been sent so summarizing never adds to response latency
+    task = asyncio.create_task(update_summary(user_id, model))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+
+# Filters are kept structured until the end so the compiler can reorder, merge and
+# drop them. Stages run in order: geometry first so later filters touch fewer pixels,
+# then color, then detail, with timing last since setpts doesn't touch pixels.
+GEOMETRY, COLOR, DETAIL, TIMING = range(4)
+STAGES = {"crop": GEOMETRY, "scale": GEOMETRY, "curves": COLOR, "hue": COLOR, "eq": COLOR,
+          "boxblur": DETAIL, "unsharp": DETAIL, "setpts": TIMING}
+
+@dataclass(frozen=True)
+class Filter:
+    name: str
+    options: tuple[tuple[str, str], ...] = ()
+
+    def render(self) -> str:
+        if not self.options:
+            return self.name
+        return f"{self.name}=" + ":".join(f"{key}={value}" for key, value in self.options)
+
+    def option(self, key: str, default: float) -> float:
+        return float(dict(self.options).get(key, default))
+
+def eq(brightness: float = 0.0, contrast: float = 1.0, saturation: float = 1.0) -> Filter | None:
+    # Neutral settings are left out; an all-neutral eq is no filter at all
+    options = []
+    if round(brightness, 6) != 0.0:
+        options.append(("brightness", f"{brightness:g}"))
+    if round(contrast, 6) != 1.0:
+        options.append(("contrast", f"{contrast:g}"))
+    if round(saturation, 6) != 1.0:
+        options.append(("saturation", f"{saturation:g}"))
+    return Filter("eq", tuple(options)) if options else None
+
+def setpts(factor: float) -> Filter:
+    return Filter("setpts", (("expr", f"{factor:g}*PTS"),))
+
+def speed_of(f: Filter) -> float:
+    return float(dict(f.options)["expr"].split("*")[0])
+
+EFFECTS = {
+    "vintage": [Filter("curves", (("preset", "vintage"),))],
+    "black and white": [Filter("hue", (("s", "0"),))],
+    "grayscale": [Filter("hue", (("s", "0"),))],
+    "increase brightness": [eq(brightness=0.3)],
+    "decrease brightness": [eq(brightness=-0.3)],
+    "cinematic": [Filter("crop", (("w", "iw"), ("h", "ih-140"))), eq(contrast=1.2, saturation=1.2)], # basic cinematic look
+    "slow motion": [setpts(2.0)],
+    "fast motion": [setpts(0.5)],
+    "blur": [Filter("boxblur", (("luma_radius", "10"), ("luma_power", "1")))],
+    "sharpen": [Filter("unsharp", (("lx", "5"), ("ly", "5"), ("la", "1.0"), ("cx", "5"), ("cy", "5"), ("ca", "0.0")))],
+}
+
+def fuse_eq(first: Filter, second: Filter) -> Filter | None:
+    # eq computes contrast * (v - 0.5) + 0.5 + brightness, so two passes compose to a
+    # single one with multiplied contrast and the first brightness scaled by the second contrast
+    c1, c2 = first.option("contrast", 1.0), second.option("contrast", 1.0)
+    return eq(
+        brightness=first.option("brightness", 0.0) * c2 + second.option("brightness", 0.0),
+        contrast=c1 * c2,
+        saturation=first.option("saturation", 1.0) * second.option("saturation", 1.0),
+    )
+
+def atempo_chain(tempo: float) -> str:
+    # A single atempo only accepts 0.5..2.0, so larger changes are chained
+    filters = []
+    while tempo > 2.0:
+        filters.append("atempo=2.0")
+        tempo /= 2.0
+    while tempo < 0.5:
+        filters.append("atempo=0.5")
+        tempo /= 0.5
+    filters.append(f"atempo={tempo:g}")
+    return ",".join(filters)
+
+@dataclass(frozen=True)
+class FilterGraph:
+    filters: tuple[Filter, ...] = ()
+    speed: float = 1.0  # output duration relative to the input
+
+    def video_filter(self, scale: Filter | None = None) -> str | None:
+        # scale (from the transcode planner) goes right after any cropping
+        filters = list(self.filters)
+        if scale is not None:
+            filters.insert(sum(1 for f in filters if STAGES[f.name] == GEOMETRY), scale)
+        return ",".join(f.render() for f in filters) or None
+
+    @property
+    def video(self) -> str | None:
+        return self.video_filter()
+
+    @property
+    def audio(self) -> str | None:
+        return atempo_chain(1 / self.speed) if self.speed != 1.0 else None
+
+    @property
+    def key(self) -> str:
+        # Normalized form: prompts that compile to the same graph share it
+        return f"{self.video or ''}|{self.audio or ''}"
+
+def compile_prompt(prompt: str) -> FilterGraph:
+    prompt = prompt.lower()
+    matched = [(prompt.rfind(keyword), effect) for keyword, effect in EFFECTS.items() if keyword in prompt]
+
+    # Conflicting speed changes: the one mentioned last wins
+    timing = [(position, f) for position, effect in matched for f in effect if STAGES[f.name] == TIMING]
+    speed = speed_of(max(timing, key=lambda item: item[0])[1]) if timing else 1.0
+
+    # Stable sort keeps the table order within a stage; duplicates are dropped
+    filters = []
+    for f in sorted((f for _, effect in matched for f in effect if STAGES[f.name] != TIMING), key=lambda f: STAGES[f.name]):
+        if f not in filters:
+            filters.append(f)
+
+    fused = []
+    for f in filters:
+        if fused and f.name == "eq" and fused[-1].name == "eq":
+            merged = fuse_eq(fused.pop(), f)
+            if merged is not None:
+                fused.append(merged)
+        else:
+            fused.append(f)
+
+    if speed != 1.0:
+        fused.append(setpts(speed))
+    return FilterGraph(tuple(fused), speed)
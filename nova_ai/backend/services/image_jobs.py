@@ -0,0 +1,75 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from ..config import settings
+from ..database import SessionLocal
+from . import image_service
+from .job_queue import Job, JobQueue, JobQueueFullError
+
+class ImageJob(Job):
+    def __init__(self, user, prompt: str, seed: int | None = None, priority: int = 0):
+        super().__init__(user, priority)
+        self.prompt = prompt
+        self.seed = seed
+        self.step = 0
+        self.total_steps = 0
+        self.image_id = None
+        self.image_url = None
+
+    def on_step(self, step: int, total_steps: int):
+        # Called from the diffusers step callback; raising here aborts the run
+        self.step = step
+        self.total_steps = total_steps
+        if self.cancel_event.is_set():
+            raise image_service.GenerationCancelled()
+
+    def to_dict(self):
+        return {
+            **super().to_dict(),
+            "prompt": self.prompt,
+            "progress": self.step / self.total_steps if self.total_steps else (1.0 if self.status == "completed" else 0.0),
+            "step": self.step,
+            "total_steps": self.total_steps,
+            "image_id": self.image_id,
+            "image_url": self.image_url,
+        }
+
+class ImageJobQueue(JobQueue):
+    # Generations run on a small dedicated thread pool, never on the request path
+    kind = "Image"
+    failure_message = "Image generation failed"
+
+    def __init__(self):
+        super().__init__(settings.IMAGE_WORKERS, settings.IMAGE_QUEUE_MAX, settings.IMAGE_JOB_TTL)
+        self._executor: ThreadPoolExecutor | None = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-worker")
+        super().start()
+
+    async def stop(self):
+        await super().stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, user, prompt: str, seed: int | None = None, priority: int = 0) -> ImageJob:
+        return self.enqueue(ImageJob(user, prompt, seed, priority))
+
+    async def execute(self, job: ImageJob):
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._run, job)
+        except image_service.GenerationCancelled:
+            job.status = "cancelled"
+
+    def _run(self, job: ImageJob):
+        db = SessionLocal()
+        try:
+            image = image_service.generate_image(db, job.user, job.prompt, job.seed, on_step=job.on_step, cancel_event=job.cancel_event)
+            job.image_id = image.id
+            job.image_url = image.image_path
+            job.status = "completed"
+        finally:
+            db.close()
+
+jobs = ImageJobQueue()
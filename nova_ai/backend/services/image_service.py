@@ -2,99 +2,250 @@ import os
 import uuid
 import json
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from ..models import Image as DBImage
 from ..config import settings
+from .. import metrics
 from PIL import Image as PILImage, ImageDraw
+from .model_manager import manager, SD_LIBRARY_PRESENT
+from . import image_store, image_variants, inference_client
 
 logger = logging.getLogger(__name__)
 
-SD_PIPELINE = None
-SD_AVAILABLE = False
-SD_LIBRARY_PRESENT = False
-
-try:
-    import torch
-    from diffusers import StableDiffusionPipeline
-    SD_LIBRARY_PRESENT = True
-except ImportError:
+class GenerationCancelled(Exception):
     pass
 
-def load_model():
-    global SD_PIPELINE, SD_AVAILABLE
-    if SD_AVAILABLE and SD_PIPELINE:
-        return
-
-    if not SD_LIBRARY_PRESENT:
-        SD_AVAILABLE = False
-        return
-
-    try:
-        logger.info("Loading Stable Diffusion model...")
-        model_id = settings.DIFFUSION_MODEL_ID
-
-        # Optimize for CPU
-        device = "cpu"
-        if torch.cuda.is_available():
-            device = "cuda"
-
-        pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=torch.float32)
-        pipe = pipe.to(device)
-        pipe.enable_attention_slicing()
-
-        SD_PIPELINE = pipe
-        SD_AVAILABLE = True
-        logger.info("Stable Diffusion model loaded successfully.")
-    except Exception as e:
-        logger.error(f"Failed to load Stable Diffusion model: {e}")
-        SD_AVAILABLE = False
+class _BatchItem:
+    def __init__(self, prompt: str, seed: int, params: tuple, on_step):
+        self.prompt = prompt
+        self.seed = seed
+        self.params = params  # (steps, height, width, guidance); only equal params share a batch
+        self.on_step = on_step
+        self.cancelled = False
+        self.future = Future()
+
+class BatchScheduler:
+    # Requests arriving within IMAGE_BATCH_WAIT seconds of each other are grouped by
+    # compatible parameters and run as one batched pipeline call, which keeps the UNet
+    # matmuls larger and is markedly faster per image than running prompts one by one.
+
+    def __init__(self, max_batch: int, max_wait: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, seed: int, steps: int, height: int, width: int, guidance: float, on_step=None):
+        # Blocks the calling worker thread until its image is ready
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sd-batcher", daemon=True)
+                self._thread.start()
+        item = _BatchItem(prompt, seed, (steps, height, width, guidance), on_step)
+        self._queue.put(item)
+        return item.future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            groups: dict[tuple, list[_BatchItem]] = {}
+            for item in self._collect():
+                groups.setdefault(item.params, []).append(item)
+            for items in groups.values():
+                self._run_group(items)
+
+    def _run_group(self, items: list[_BatchItem]):
+        steps, height, width, guidance = items[0].params
+
+        def step_callback(pipe, step, timestep, callback_kwargs):
+            for item in items:
+                if item.cancelled or item.on_step is None:
+                    continue
+                try:
+                    item.on_step(step + 1, steps)
+                except GenerationCancelled:
+                    item.cancelled = True
+            # Keep going for the others; stop only when nobody wants the result anymore
+            if all(item.cancelled for item in items):
+                raise GenerationCancelled()
+            return callback_kwargs
+
+        try:
+            with manager.acquire() as pipe:
+                images = pipe(
+                    [item.prompt for item in items],
+                    num_inference_steps=steps,
+                    height=height,
+                    width=width,
+                    guidance_scale=guidance,
+                    generator=manager.generators(pipe, [item.seed for item in items]),
+                    callback_on_step_end=step_callback,
+                ).images
+        except Exception as e:
+            for item in items:
+                item.future.set_exception(GenerationCancelled() if item.cancelled else e)
+            return
+
+        for item, image in zip(items, images):
+            if item.cancelled:
+                item.future.set_exception(GenerationCancelled())
+            else:
+                item.future.set_result(image)
+
+scheduler = BatchScheduler(settings.IMAGE_BATCH_MAX, settings.IMAGE_BATCH_WAIT)
 
 def create_mock_image(prompt, filepath):
     img = PILImage.new('RGB', (512, 512), color = (73, 109, 137))
     d = ImageDraw.Draw(img)
     d.text((10,10), "Mock Image\n" + prompt[:50], fill=(255,255,0))
-    img.save(filepath)
-
-def generate_image(db, user, prompt: str):
-    global SD_PIPELINE, SD_AVAILABLE
-
-    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    static_dir = os.path.join(base_dir, "static")
-    generated_dir = os.path.join(static_dir, "generated")
-
-    filename = f"{uuid.uuid4()}.png"
-    # Ensure directory exists
-    os.makedirs(generated_dir, exist_ok=True)
-    filepath = os.path.join(generated_dir, filename)
-    relative_path = f"/static/generated/{filename}"
+    img.save(filepath, format="PNG")
+
+def _produce(prompt: str, seed: int, model: str, params: dict, on_step):
+    # Returns (url, cache_hit). Files are named by a hash of everything that determines
+    # the pixels, so an identical request reuses the existing file.
+    key = image_store.cache_key(prompt, seed, model, params)
+    filepath, url = image_store.path_for(key)
+
+    with image_store.key_lock(key):
+        if image_store.lookup(key):
+            return url, True
+
+        os.makedirs(image_store.GENERATED_DIR, exist_ok=True)
+        # Written under a temporary name so readers never see a partial PNG
+        tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+        try:
+            if model == "mock":
+                create_mock_image(prompt, tmp_path)
+            else:
+                image = scheduler.generate(
+                    prompt, seed, params["steps"], params["size"], params["size"], params["guidance"], on_step=on_step
+                )
+                image.save(tmp_path, format="PNG")
+            os.replace(tmp_path, filepath)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return url, False
+
+def _params():
+    profile = manager.profile
+    return {
+        "steps": profile.steps,
+        "size": profile.size,
+        "guidance": profile.guidance,
+        "scheduler": profile.scheduler,
+        "dtype": profile.dtype,
+    }
+
+def _expected_model() -> str:
+    # The model a render would use, known without loading it
+    if settings.INFERENCE_SOCKET or (SD_LIBRARY_PRESENT and not manager.load_failed):
+        return settings.DIFFUSION_MODEL_ID
+    return "mock"
+
+def cached_image(prompt: str, seed: int):
+    # Returns (url, model, params) if this exact image is already on disk, else None
+    model = _expected_model()
+    params = _params()
+    url = image_store.lookup(image_store.cache_key(prompt, seed, model, params))
+    return (url, model, params) if url else None
+
+def render_local(prompt: str, seed: int, on_step=None):
+    # Returns (url, cache_hit, model, params), generating in this process
+    # A cache hit never waits for the model to load
+    cached = cached_image(prompt, seed)
+    if cached is not None:
+        url, model, params = cached
+        return url, True, model, params
+
+    params = _params()
+    if SD_LIBRARY_PRESENT:
+        manager.load()
 
-    generation_successful = False
+    model = settings.DIFFUSION_MODEL_ID if manager.available else "mock"
+    try:
+        relative_path, cache_hit = _produce(prompt, seed, model, params, on_step)
+    except GenerationCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating image with model: {e}")
+        model = "mock"
+        relative_path, cache_hit = _produce(prompt, seed, model, params, on_step)
+    return relative_path, cache_hit, model, params
+
+@metrics.timed("image_render")
+def render(prompt: str, seed: int, on_step=None, cancel_event=None):
+    # With INFERENCE_SOCKET set the model lives in the inference server process
+    # (python -m backend.inference_server) and this worker never loads it
+    if not settings.INFERENCE_SOCKET:
+        return render_local(prompt, seed, on_step)
+    try:
+        return inference_client.render(prompt, seed, on_step, cancel_event)
+    except GenerationCancelled:
+        raise
+    except Exception as e:
+        logger.error(f"Inference server unavailable, using mock image: {e}")
+        params = _params()
+        relative_path, cache_hit = _produce(prompt, seed, "mock", params, on_step)
+        return relative_path, cache_hit, "mock", params
 
-    if SD_LIBRARY_PRESENT:
-        if SD_PIPELINE is None:
-            load_model()
+def record_image(db, user, prompt: str, seed: int, relative_path: str, cache_hit: bool, model: str, params: dict):
+    metrics.cache_lookups.inc("image", "hit" if cache_hit else "miss")
 
-        if SD_AVAILABLE:
-            try:
-                # Use fewer steps for CPU optimization
-                image = SD_PIPELINE(prompt, num_inference_steps=20).images[0]
-                image.save(filepath)
-                generation_successful = True
-            except Exception as e:
-                logger.error(f"Error generating image with model: {e}")
-                generation_successful = False
-
-    if not generation_successful:
-        create_mock_image(prompt, filepath)
-
-    # Save to DB
+    # Save to DB; a cache hit only adds a row pointing at the existing file
     new_image = DBImage(
         user_id=user.id,
         prompt=prompt,
         image_path=relative_path,
-        parameters=json.dumps({"model": "stable-diffusion-v1-5" if generation_successful else "mock"})
+        parameters=json.dumps({
+            "model": "stable-diffusion-v1-5" if model != "mock" else "mock",
+            "profile": settings.SD_PROFILE,
+            "seed": seed,
+            "cached": cache_hit,
+            **params,
+        })
     )
     db.add(new_image)
     db.commit()
     db.refresh(new_image)
 
+    if not cache_hit:
+        image_variants.submit(relative_path)
+        image_store.after_write(db)
+
     return new_image
+
+@metrics.timed("generate_image")
+def generate_image(db, user, prompt: str, seed: int | None = None, on_step=None, cancel_event=None):
+    # on_step(step, total_steps) reports progress; raising GenerationCancelled from it aborts the run.
+    # cancel_event is also polled while waiting on the inference server, before any step arrives.
+    if seed is None:
+        seed = image_store.default_seed(prompt)
+    relative_path, cache_hit, model, params = render(prompt, seed, on_step, cancel_event)
+    return record_image(db, user, prompt, seed, relative_path, cache_hit, model, params)
+
+def generate_cached(db, user, prompt: str, seed: int | None = None):
+    # Records and returns the Image if it is already cached, else None; never renders
+    if seed is None:
+        seed = image_store.default_seed(prompt)
+    cached = cached_image(prompt, seed)
+    if cached is None:
+        return None
+    relative_path, model, params = cached
+    return record_image(db, user, prompt, seed, relative_path, True, model, params)
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import func
+from ..config import settings
+from ..models import Image as DBImage
+from . import storage, image_variants
+
+GENERATED_DIR = os.path.join(storage.STATIC_DIR, "generated")
+
+# key -> [lock, holders and waiters]; the entry goes when the last of them is done
+_key_locks: dict[str, list] = {}
+_key_locks_guard = threading.Lock()
+_written_since_check = 0
+
+def default_seed(prompt: str) -> int:
+    # Without an explicit seed the prompt picks it, so re-submitted prompts hit the cache
+    return int(hashlib.sha256(prompt.encode()).hexdigest()[:8], 16)
+
+def cache_key(prompt: str, seed: int, model: str, params: dict) -> str:
+    payload = json.dumps({"prompt": prompt, "seed": seed, "model": model, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def path_for(key: str):
+    filename = f"{key}.png"
+    return os.path.join(GENERATED_DIR, filename), f"/static/generated/{filename}"
+
+def lookup(key: str) -> str | None:
+    filepath, url = path_for(key)
+    if not os.path.exists(filepath):
+        return None
+    storage.touch(filepath)
+    return url
+
+@contextmanager
+def key_lock(key: str):
+    # Identical in-flight requests wait for the first one instead of generating twice
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _key_locks[key]
+
+def reference_count(db, url: str) -> int:
+    return db.query(func.count(DBImage.id)).filter(DBImage.image_path == url).scalar()
+
+def enforce_quota(db):
+    # Only files no Image row points at can go, so history never loses an image.
+    # Fresh files are skipped too: their row may not be committed yet.
+    def is_referenced(path):
+        if time.time() - os.path.getmtime(path) < 60:
+            return True
+        return reference_count(db, storage.static_url(path)) > 0
+    def drop_variants(path):
+        image_variants.remove_for(storage.static_url(path))
+    # Variants live in a subdirectory the scan skips, so each original carries their size
+    def variants_size(path):
+        return image_variants.size_for(storage.static_url(path))
+
+    return storage.evict_lru(GENERATED_DIR, settings.IMAGE_CACHE_MAX_BYTES, is_referenced, drop_variants, variants_size)
+
+def after_write(db):
+    # Scanning the directory is O(files), so check the quota every few writes only
+    global _written_since_check
+    with _key_locks_guard:
+        _written_since_check += 1
+        due = _written_since_check >= settings.IMAGE_CACHE_CHECK_EVERY
+        if due:
+            _written_since_check = 0
+    if due:
+        enforce_quota(db)
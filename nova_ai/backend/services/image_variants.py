@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image as PILImage, features
+from ..config import settings
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = os.path.join(storage.STATIC_DIR, "generated", "variants")
+# WebP needs Pillow built with libwebp; JPEG is always there
+FORMAT, EXTENSION = ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"images": 0, "original_bytes": 0, "variant_bytes": 0, "encode_seconds": 0.0}
+
+def _variant_paths(image_path: str):
+    # image_path is the original's /static URL; variants share its file stem
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    display = os.path.join(VARIANTS_DIR, f"{stem}.{EXTENSION}")
+    thumbnail = os.path.join(VARIANTS_DIR, f"{stem}_thumb.{EXTENSION}")
+    return display, thumbnail
+
+def urls_for(image_path: str):
+    # Falls back to the original until the variants exist (e.g. images made before this stage)
+    display, thumbnail = _variant_paths(image_path)
+    return {
+        "display_url": storage.static_url(display) if os.path.exists(display) else image_path,
+        "thumbnail_url": storage.static_url(thumbnail) if os.path.exists(thumbnail) else image_path,
+    }
+
+def size_for(image_path: str) -> int:
+    total = 0
+    for path in _variant_paths(image_path):
+        try:
+            total += os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+    return total
+
+def remove_for(image_path: str):
+    for path in _variant_paths(image_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _save(img, path):
+    tmp_path = f"{path}.tmp"
+    img.save(tmp_path, format=FORMAT, quality=settings.IMAGE_VARIANT_QUALITY, method=4 if FORMAT == "WEBP" else None)
+    os.replace(tmp_path, path)
+
+def build(image_path: str):
+    source = storage.static_path(image_path)
+    display, thumbnail = _variant_paths(image_path)
+    if os.path.exists(display) and os.path.exists(thumbnail):
+        return
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+
+    started = time.perf_counter()
+    with PILImage.open(source) as img:
+        img = img.convert("RGB")
+        _save(img, display)
+        img.thumbnail((settings.IMAGE_THUMBNAIL_SIZE, settings.IMAGE_THUMBNAIL_SIZE))
+        _save(img, thumbnail)
+    elapsed = time.perf_counter() - started
+
+    original_bytes = os.path.getsize(source)
+    variant_bytes = os.path.getsize(display)
+    with _stats_lock:
+        _stats["images"] += 1
+        _stats["original_bytes"] += original_bytes
+        _stats["variant_bytes"] += variant_bytes
+        _stats["encode_seconds"] += elapsed
+    logger.info(
+        f"Encoded variants for {image_path} in {elapsed * 1000:.0f} ms: "
+        f"{original_bytes} -> {variant_bytes} bytes ({FORMAT}), thumbnail {os.path.getsize(thumbnail)} bytes"
+    )
+
+def _build_logged(image_path: str):
+    try:
+        build(image_path)
+    except Exception as e:
+        logger.error(f"Failed to encode variants for {image_path}: {e}")
+
+def submit(image_path: str):
+    # Encoding runs after the job has finished so it never delays the result
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix="image-variants")
+        _executor.submit(_build_logged, image_path)
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+def stats():
+    with _stats_lock:
+        result = dict(_stats)
+    result["bytes_saved"] = result["original_bytes"] - result["variant_bytes"]
+    return result
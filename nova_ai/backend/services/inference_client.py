@@ -0,0 +1,57 @@
+import json
+import socket
+from ..config import settings
+
+# Talks to backend/inference_server.py over INFERENCE_SOCKET. One connection per
+# generation, one JSON object per line each way:
+#   -> {"prompt": ..., "seed": ...}
+#   <- {"event": "step", "step": n, "total": n} ...
+#   <- {"event": "done", "url": ..., "cached": ..., "model": ..., "params": {...}}
+#      or {"event": "error", "message": ..., "cancelled": bool}
+# Closing the connection early cancels the generation on the server.
+
+# How often a blocked read wakes up to check for cancellation
+CANCEL_POLL_SECONDS = 0.25
+
+def _messages(sock: socket.socket, cancel_event=None):
+    # Generations take as long as they take, so reads only time out to poll cancel_event
+    from .image_service import GenerationCancelled
+
+    sock.settimeout(CANCEL_POLL_SECONDS)
+    buffer = b""
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()
+        try:
+            data = sock.recv(65536)
+        except TimeoutError:
+            continue
+        if not data:
+            return
+        buffer += data
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            yield json.loads(line)
+
+def render(prompt: str, seed: int, on_step=None, cancel_event=None):
+    # Blocking; called from image worker threads. Returns (url, cache_hit, model, params).
+    from .image_service import GenerationCancelled
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(settings.INFERENCE_CONNECT_TIMEOUT)
+        sock.connect(settings.INFERENCE_SOCKET)
+        sock.sendall(json.dumps({"prompt": prompt, "seed": seed}).encode() + b"\n")
+
+        for message in _messages(sock, cancel_event):
+            event = message.get("event")
+            if event == "step":
+                if on_step is not None:
+                    # Raising GenerationCancelled here (or cancel_event) closes the socket, which cancels remotely
+                    on_step(message["step"], message["total"])
+            elif event == "done":
+                return message["url"], message["cached"], message["model"], message["params"]
+            elif event == "error":
+                if message.get("cancelled"):
+                    raise GenerationCancelled()
+                raise RuntimeError(message.get("message", "Inference server error"))
+    raise ConnectionError("Inference server closed the connection")
@@ -0,0 +1,158 @@
+import abc
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFullError(Exception):
+    def __init__(self, kind: str = "Job", retry_after: int = 10):
+        super().__init__(f"{kind} queue is full, try again later")
+        self.retry_after = retry_after
+
+class Job:
+    RUNNING = "running"  # status while a worker owns the job
+
+    def __init__(self, user, priority: int = 0):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.priority = priority
+        self.status = "queued"  # queued -> RUNNING -> completed | failed | cancelled
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.admission = None  # ticket handed off by the admission dependency, released when finished
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            # Waiting (admission + job queue) reported apart from the time spent working
+            "queue_wait_seconds": ((self.started_at or self.finished_at or time.time()) - self.created_at) + (self.admission.queue_wait if self.admission else 0.0),
+            "service_seconds": ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0,
+            "error": self.error,
+        }
+
+class JobQueue(abc.ABC):
+    # Priority queue (lower value first, FIFO among equals) drained by a fixed set of
+    # asyncio workers. Subclasses implement execute(job) and may override on_cancel
+    # and on_interrupted.
+    kind = "Job"
+    failure_message = "Job failed"  # shown to users; details go to the log
+
+    def __init__(self, workers: int, queue_max: int, job_ttl: float):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.job_ttl = job_ttl
+        self.jobs: dict[str, Job] = {}
+        self._queue: asyncio.PriorityQueue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._counter = itertools.count()
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Unfinished jobs end as cancelled if they never started or a user cancelled them,
+        # otherwise as failed, so nothing is left looking like it is still running
+        interrupted = {
+            job: "cancelled" if job.status == "queued" or job.cancel_event.is_set() else "failed"
+            for job in self.jobs.values() if not job.finished
+        }
+        for job in interrupted:
+            self.on_cancel(job)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for job, status in interrupted.items():
+            if job.finished:
+                continue
+            job.status = status
+            if status == "failed":
+                job.error = job.error or "Interrupted by a server shutdown"
+            self._finish(job)
+            try:
+                await self.on_interrupted(job)
+            except Exception as e:
+                logger.error(f"Could not record interrupted {self.kind} job {job.id}: {e}")
+
+    def enqueue(self, job: Job) -> Job:
+        self.start()
+        self._prune()
+        if not self.has_capacity():
+            raise JobQueueFullError(self.kind)
+        self.jobs[job.id] = job
+        self._queue.put_nowait((job.priority, next(self._counter), job))
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job: Job):
+        if job.finished:
+            return
+        self.on_cancel(job)
+        if job.status == "queued":
+            # Workers skip cancelled jobs when they reach the front of the queue
+            job.status = "cancelled"
+            self._finish(job)
+
+    def on_cancel(self, job: Job):
+        job.cancel_event.set()
+
+    async def on_interrupted(self, job: Job):
+        # Called by stop() for each job it finished; persist the final status here
+        pass
+
+    def has_capacity(self) -> bool:
+        return self.queue_depth() < self.queue_max
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    @abc.abstractmethod
+    async def execute(self, job: Job):
+        ...
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            if job.status == "cancelled":
+                continue
+            job.status = job.RUNNING
+            job.started_at = time.time()
+            try:
+                await self.execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.kind} job {job.id} failed: {e}")
+                job.status = "failed"
+                job.error = job.error or self.failure_message
+            self._finish(job)
+
+    def _finish(self, job: Job):
+        job.finished_at = time.time()
+        if job.admission is not None:
+            job.admission.release()
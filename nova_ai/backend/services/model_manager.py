@@ -0,0 +1,170 @@
+import gc
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+SD_LIBRARY_PRESENT = False
+
+try:
+    import torch
+    from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler, EulerAncestralDiscreteScheduler
+    SD_LIBRARY_PRESENT = True
+except ImportError:
+    pass
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    steps: int = 20
+    size: int = 512
+    guidance: float = 7.5
+    scheduler: str = "default"  # "default", "dpm++" or "euler_a"
+    dtype: str = "float32"  # "bfloat16" falls back to float32 where unsupported
+    channels_last: bool = False
+
+# Operators pick one with SD_PROFILE to trade quality for latency
+PROFILES = {
+    "quality": InferenceProfile(),
+    "balanced": InferenceProfile(steps=15, scheduler="dpm++", channels_last=True),
+    "fast": InferenceProfile(steps=8, size=384, scheduler="dpm++", dtype="bfloat16", channels_last=True),
+}
+
+def _bf16_supported(device: str) -> bool:
+    try:
+        if device == "cuda":
+            return torch.cuda.is_bf16_supported()
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+class ModelManager:
+    # Owns the Stable Diffusion pipeline: single-flight loading, optional warmup,
+    # and unloading after SD_IDLE_UNLOAD_SECONDS without use to give the RAM back.
+
+    def __init__(self, profile: InferenceProfile):
+        self.profile = profile
+        self.pipeline = None
+        self.available = False
+        self.load_failed = False
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._last_used = time.monotonic()
+        self._reaper: threading.Thread | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.pipeline is not None
+
+    def load(self):
+        # A failed load is not retried on every request; restart the app after fixing it
+        if self.pipeline is not None or self.load_failed or not SD_LIBRARY_PRESENT:
+            return
+        # Concurrent first requests wait here instead of each loading multi-GB weights
+        with self._lock:
+            if self.pipeline is not None or self.load_failed:
+                return
+            try:
+                self.pipeline = self._build_pipeline()
+                self.available = True
+                self._last_used = time.monotonic()
+                self._start_reaper()
+            except Exception as e:
+                logger.error(f"Failed to load Stable Diffusion model: {e}")
+                self.available = False
+                self.load_failed = True
+
+    def _build_pipeline(self):
+        logger.info("Loading Stable Diffusion model...")
+        profile = self.profile
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        dtype = torch.float32
+        if profile.dtype == "bfloat16":
+            if _bf16_supported(device):
+                dtype = torch.bfloat16
+            else:
+                logger.info("bfloat16 is not supported on this device, using float32")
+
+        pipe = StableDiffusionPipeline.from_pretrained(settings.DIFFUSION_MODEL_ID, torch_dtype=dtype)
+        pipe = pipe.to(device)
+        pipe.enable_attention_slicing()
+
+        if profile.scheduler == "dpm++":
+            pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+        elif profile.scheduler == "euler_a":
+            pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(pipe.scheduler.config)
+        if profile.channels_last:
+            pipe.unet.to(memory_format=torch.channels_last)
+        if settings.SD_TORCH_COMPILE and hasattr(torch, "compile"):
+            pipe.unet = torch.compile(pipe.unet)
+
+        logger.info(f"Stable Diffusion model loaded successfully ({device}, {dtype}, {profile}).")
+        return pipe
+
+    def warmup(self):
+        # Load ahead of the first request and run one tiny pass so lazy allocations
+        # and torch.compile happen at startup rather than on a user's request
+        self.load()
+        if not self.available:
+            return
+        try:
+            with self.acquire() as pipe:
+                pipe("warmup", num_inference_steps=1, height=self.profile.size, width=self.profile.size)
+            logger.info("Stable Diffusion warmup done.")
+        except Exception as e:
+            logger.warning(f"Stable Diffusion warmup failed: {e}")
+
+    @staticmethod
+    def generators(pipe, seeds: list[int]):
+        # One generator per prompt keeps each image reproducible regardless of batching
+        return [torch.Generator(device=pipe.device).manual_seed(seed) for seed in seeds]
+
+    @contextmanager
+    def acquire(self):
+        self.load()
+        with self._lock:
+            if self.pipeline is None:
+                raise RuntimeError("Stable Diffusion model is not available")
+            self._in_use += 1
+            pipe = self.pipeline
+        try:
+            yield pipe
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._last_used = time.monotonic()
+
+    def unload(self):
+        with self._lock:
+            if self.pipeline is None or self._in_use:
+                return
+            self.pipeline = None
+            self.available = False
+        gc.collect()
+        if SD_LIBRARY_PRESENT and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        logger.info("Stable Diffusion model unloaded.")
+
+    def _start_reaper(self):
+        if settings.SD_IDLE_UNLOAD_SECONDS <= 0 or (self._reaper and self._reaper.is_alive()):
+            return
+        self._reaper = threading.Thread(target=self._reap, name="sd-idle-unload", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        interval = min(60.0, settings.SD_IDLE_UNLOAD_SECONDS / 2)
+        while self.pipeline is not None:
+            time.sleep(interval)
+            if not self._in_use and time.monotonic() - self._last_used > settings.SD_IDLE_UNLOAD_SECONDS:
+                self.unload()
+
+def _configured_profile() -> InferenceProfile:
+    if settings.SD_PROFILE not in PROFILES:
+        logger.warning(f"Unknown SD_PROFILE '{settings.SD_PROFILE}', using 'quality'")
+    return PROFILES.get(settings.SD_PROFILE, PROFILES["quality"])
+
+manager = ModelManager(_configured_profile())
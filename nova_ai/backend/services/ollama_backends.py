@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the per-backend latency average
+LATENCY_ALPHA = 0.2
+
+def model_key(model: str) -> str:
+    # "tinyllama" and "tinyllama:latest" name the same model
+    return model[:-len(":latest")] if model.endswith(":latest") else model
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.in_flight = 0
+        self.latency = None  # moving average of time-to-headers, seconds
+        self.loaded_models: set[str] = set()  # resident in memory (/api/ps)
+        self.available_models: set[str] | None = None  # pulled on disk (/api/tags), None until first check
+        self.failures = 0
+
+    def record_latency(self, seconds: float):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * self.latency
+
+    def affinity(self, model: str) -> int:
+        # Lower is better: already loaded, then pulled, then unknown
+        key = model_key(model)
+        if key in self.loaded_models:
+            return 0
+        if self.available_models is None or key in self.available_models:
+            return 1
+        return 2
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "latency": self.latency,
+            "loaded_models": sorted(self.loaded_models),
+            "failures": self.failures,
+        }
+
+class BackendPool:
+    # Picks the least-loaded healthy Ollama backend, preferring ones that already hold the model.
+
+    def __init__(self, urls: list[str]):
+        self.backends = [Backend(url) for url in urls]
+
+    def pick(self, model: str, exclude: set[str] = frozenset()) -> Backend | None:
+        candidates = [b for b in self.backends if b.url not in exclude]
+        if not candidates:
+            return None
+        # Unhealthy backends are only a last resort; the next health check may revive them
+        healthy = [b for b in candidates if b.healthy] or candidates
+        return min(healthy, key=lambda b: (b.affinity(model), b.in_flight, b.latency or 0.0))
+
+    def serving(self, model: str) -> int:
+        # Healthy backends that have (or may have) the model; at least one so requests can
+        # still try the unhealthy ones
+        return max(1, sum(1 for b in self.backends if b.healthy and b.affinity(model) < 2))
+
+    def mark_failed(self, backend: Backend, error):
+        backend.failures += 1
+        if backend.healthy:
+            logger.warning(f"Ollama backend {backend.url} marked unhealthy: {error}")
+        backend.healthy = False
+
+    async def check(self, session: aiohttp.ClientSession, backend: Backend, timeout: float):
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=timeout)
+            async with session.get(f"{backend.url}/tags", timeout=client_timeout) as response:
+                response.raise_for_status()
+                tags = await response.json()
+            async with session.get(f"{backend.url}/ps", timeout=client_timeout) as response:
+                response.raise_for_status()
+                ps = await response.json()
+        except Exception as e:
+            self.mark_failed(backend, e)
+            return
+
+        backend.available_models = {model_key(m["name"]) for m in tags.get("models", [])}
+        backend.loaded_models = {model_key(m["name"]) for m in ps.get("models", [])}
+        if not backend.healthy:
+            logger.info(f"Ollama backend {backend.url} is healthy again")
+        backend.healthy = True
+
+    async def refresh(self, session: aiohttp.ClientSession, timeout: float):
+        await asyncio.gather(*(self.check(session, b, timeout) for b in self.backends))
+
+    async def run_health_checks(self, session: aiohttp.ClientSession, interval: float, timeout: float):
+        while True:
+            await self.refresh(session, timeout)
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        return [b.stats() for b in self.backends]
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+import aiohttp
+from ..config import settings
+from .ollama_backends import BackendPool, model_key
+
+logger = logging.getLogger(__name__)
+
+class OllamaBusyError(Exception):
+    # Raised when a model's wait queue is full; routers turn this into a 429
+    def __init__(self, model: str, retry_after: int = 5):
+        super().__init__(f"Model '{model}' is busy, try again later")
+        self.model = model
+        self.retry_after = retry_after
+
+class OllamaUnavailableError(Exception):
+    pass
+
+class ModelSlots:
+    # Counting semaphore whose limit is passed in on every call, so it can follow the number
+    # of backends serving the model. Waiters are woken in FIFO order.
+    def __init__(self):
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def full(self, limit: int) -> bool:
+        return self.active >= limit
+
+    async def acquire(self, limit: int):
+        requeue = False
+        while self.active >= limit:
+            waiter = asyncio.get_running_loop().create_future()
+            # A waiter that lost its slot to a newcomer keeps its place at the front
+            if requeue:
+                self._waiters.appendleft(waiter)
+            else:
+                self._waiters.append(waiter)
+            requeue = True
+            try:
+                await waiter
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    # Woken and cancelled at the same time: pass the wakeup on
+                    self._wake(limit)
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.active += 1
+
+    def release(self, limit: int):
+        self.active -= 1
+        self._wake(limit)
+
+    def _wake(self, limit: int):
+        free = limit - self.active
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+class OllamaClient:
+    # One keep-alive connection pool for the whole app plus per-model concurrency limits.
+    # Requests are routed across every configured Ollama backend.
+
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+        self._slots: dict[str, ModelSlots] = defaultdict(ModelSlots)
+        self._waiting: dict[str, int] = defaultdict(int)
+        self._health_task: asyncio.Task | None = None
+        self.pool = BackendPool(settings.OLLAMA_BASE_URLS or [settings.OLLAMA_BASE_URL])
+
+    async def start(self):
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=settings.OLLAMA_MAX_CONNECTIONS,
+            keepalive_timeout=settings.OLLAMA_KEEPALIVE_TIMEOUT,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=settings.OLLAMA_CONNECT_TIMEOUT,
+            sock_read=settings.OLLAMA_READ_TIMEOUT,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        if len(self.pool.backends) > 1:
+            self._health_task = asyncio.create_task(self.pool.run_health_checks(
+                self._session, settings.OLLAMA_HEALTH_INTERVAL, settings.OLLAMA_CONNECT_TIMEOUT
+            ))
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        # Started by the app lifespan; lazily created for scripts and tests
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def limit_for(self, model: str) -> int:
+        # The configured concurrency is per backend, so every backend serving the model adds slots
+        key = model_key(model)
+        per_backend = settings.OLLAMA_MODEL_CONCURRENCY.get(key, settings.OLLAMA_MAX_CONCURRENCY)
+        return per_backend * self.pool.serving(key)
+
+    def ensure_capacity(self, model: str):
+        # Fast rejection before committing to a response (e.g. an SSE stream)
+        key = model_key(model)
+        if self._slots[key].full(self.limit_for(key)) and self._waiting[key] >= settings.OLLAMA_MAX_QUEUE:
+            raise OllamaBusyError(model)
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        key = model_key(model)
+        slots = self._slots[key]
+
+        if not slots.full(self.limit_for(key)):
+            # Free slot: acquire() returns without suspending
+            await slots.acquire(self.limit_for(key))
+        else:
+            self.ensure_capacity(model)
+            self._waiting[key] += 1
+            try:
+                await asyncio.wait_for(slots.acquire(self.limit_for(key)), timeout=settings.OLLAMA_QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise OllamaBusyError(model)
+            finally:
+                self._waiting[key] -= 1
+
+        try:
+            yield
+        finally:
+            slots.release(self.limit_for(key))
+
+    @asynccontextmanager
+    async def post(self, path: str, payload: dict):
+        model = payload.get("model", "")
+        async with self.slot(model):
+            session = await self.session()
+            response, backend = await self._send(session, path, payload)
+            try:
+                async with response:
+                    yield response
+            finally:
+                backend.in_flight -= 1
+
+    async def _send(self, session: aiohttp.ClientSession, path: str, payload: dict):
+        # Fail over to the next best backend until one answers; only possible before
+        # the caller starts reading, so retries never duplicate streamed output.
+        model = payload.get("model", "")
+        tried = set()
+        last_error = None
+        while True:
+            backend = self.pool.pick(model, exclude=tried)
+            if backend is None:
+                raise OllamaUnavailableError(f"No Ollama backend could serve '{model}': {last_error}")
+            tried.add(backend.url)
+
+            started = time.monotonic()
+            backend.in_flight += 1
+            try:
+                response = await session.post(f"{backend.url}{path}", json=payload)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                backend.in_flight -= 1
+                self.pool.mark_failed(backend, e)
+                last_error = e
+                continue
+
+            backend.record_latency(time.monotonic() - started)
+            has_fallback = len(tried) < len(self.pool.backends)
+            # 404 means the model is not pulled there; 5xx means the backend is in trouble
+            if has_fallback and (response.status == 404 or response.status >= 500):
+                response.release()
+                backend.in_flight -= 1
+                last_error = f"status {response.status}"
+                if response.status >= 500:
+                    self.pool.mark_failed(backend, last_error)
+                continue
+            return response, backend
+
+    def stats(self):
+        return {
+            "models": {
+                key: {"limit": self.limit_for(key), "active": slots.active, "waiting": self._waiting[key]}
+                for key, slots in self._slots.items()
+            },
+            "backends": self.pool.stats(),
+        }
+
+client = OllamaClient()
@@ -1,40 +1,140 @@
-import aiohttp
 import json
+import logging
+import anyio
 from ..config import settings
+from ..database import AsyncSessionLocal
+from .. import write_behind, metrics
+from ..pagination import keyset_query, to_page, DEFAULT_PAGE_SIZE
 from ..models import Chat, User
-from sqlalchemy.orm import Session
+from .ollama_client import client, OllamaBusyError
+from .response_cache import cache
+from . import chat_context
+from sqlalchemy.ext.asyncio import AsyncSession
 
-async def chat_with_ollama(db: Session, user: User, message: str, model: str = "tinyllama"):
-    url = f"{settings.OLLAMA_BASE_URL}/chat"
+logger = logging.getLogger(__name__)
+
+async def _store_chat(db: AsyncSession, chat: Chat):
+    # Chat rows are append-only logs, so they can go through the batched writer when enabled
+    if write_behind.enabled():
+        write_behind.writer.submit(chat)
+        return
+    db.add(chat)
+    await db.commit()
+
+@metrics.timed("chat_with_ollama")
+async def chat_with_ollama(db: AsyncSession, user: User, message: str, model: str = "tinyllama", bypass_cache: bool = False):
+    messages = await chat_context.build_messages(db, user.id, message)
+    cached = await cache.lookup(message, model, messages[:-1], bypass=bypass_cache)
+    if cached.response is None:
+        client.ensure_capacity(model)
 
     # Store user message
     user_chat = Chat(user_id=user.id, role="user", content=message, model=model)
-    db.add(user_chat)
-    db.commit()
+    await _store_chat(db, user_chat)
+
+    if cached.response is not None:
+        await _store_chat(db, Chat(user_id=user.id, role="assistant", content=cached.response, model=model))
+        return {"response": cached.response, "cached": cached.tier}
 
     payload = {
         "model": model,
-        "messages": [{"role": "user", "content": message}],
-        "stream": False
+        "messages": messages,
+        "stream": False,
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    ai_response = result.get("message", {}).get("content", "")
-
-                    # Store AI response
-                    ai_chat = Chat(user_id=user.id, role="assistant", content=ai_response, model=model)
-                    db.add(ai_chat)
-                    db.commit()
-
-                    return {"response": ai_response}
-                else:
-                    return {"error": f"Ollama returned status {response.status}"}
+        async with client.post("/chat", payload) as response:
+            if response.status == 200:
+                result = await response.json()
+                ai_response = result.get("message", {}).get("content", "")
+
+                # Store AI response
+                ai_chat = Chat(user_id=user.id, role="assistant", content=ai_response, model=model)
+                await _store_chat(db, ai_chat)
+                cache.store(cached, ai_response)
+                chat_context.schedule_summary_update(user.id, model)
+
+                return {"response": ai_response}
+            else:
+                return {"error": f"Ollama returned status {response.status}"}
+    except OllamaBusyError:
+        raise
     except Exception as e:
         return {"error": str(e)}
 
-def get_chat_history(db: Session, user: User, limit: int = 50):
-    return db.query(Chat).filter(Chat.user_id == user.id).order_by(Chat.timestamp.desc()).limit(limit).all()
+async def prepare_stream(db: AsyncSession, user_id: int, message: str, model: str = "tinyllama", bypass_cache: bool = False):
+    # Runs before the stream starts so a busy model can still be answered with a 429.
+    # Cached answers don't need Ollama, so they skip the capacity check.
+    messages = await chat_context.build_messages(db, user_id, message)
+    cached = await cache.lookup(message, model, messages[:-1], bypass=bypass_cache)
+    if cached.response is None:
+        client.ensure_capacity(model)
+    return messages, cached
+
+async def stream_chat_with_ollama(user_id: int, message: str, model: str, messages: list, cached):
+    # Takes the result of prepare_stream. Yields ("token", text) events as they arrive,
+    # then ("done", {}) or ("error", msg).
+    # Uses its own DB session since the stream outlives the request-scoped one.
+    db = AsyncSessionLocal()
+    parts = []
+    try:
+        await _store_chat(db, Chat(user_id=user_id, role="user", content=message, model=model))
+
+        if cached.response is not None:
+            parts.append(cached.response)
+            yield "token", cached.response
+            yield "done", {"cached": cached.tier}
+            return
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE
+        }
+
+        async with client.post("/chat", payload) as response:
+            if response.status != 200:
+                yield "error", f"Ollama returned status {response.status}"
+                return
+
+            # Ollama streams one JSON object per line
+            async for line in response.content:
+                line = line.strip()
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    yield "error", chunk["error"]
+                    return
+                token = chunk.get("message", {}).get("content", "")
+                if token:
+                    parts.append(token)
+                    yield "token", token
+                if chunk.get("done"):
+                    cache.store(cached, "".join(parts))
+                    break
+
+        yield "done", {}
+    except OllamaBusyError as e:
+        yield "error", str(e)
+    except Exception as e:
+        logger.error(f"Ollama stream failed: {e}")
+        yield "error", str(e)
+    finally:
+        # Persist whatever was generated, also when the client disconnected mid-stream.
+        # Shielded because a disconnect cancels the surrounding task.
+        with anyio.CancelScope(shield=True):
+            if parts:
+                try:
+                    await _store_chat(db, Chat(user_id=user_id, role="assistant", content="".join(parts), model=model))
+                    chat_context.schedule_summary_update(user_id, model)
+                except Exception as e:
+                    logger.error(f"Failed to store streamed response: {e}")
+            await db.close()
+
+async def get_chat_history(db: AsyncSession, user: User, before: int | None = None, limit: int = DEFAULT_PAGE_SIZE):
+    columns = (Chat.id, Chat.role, Chat.content, Chat.model, Chat.timestamp)
+    result = await db.execute(keyset_query(Chat, columns, Chat.timestamp, user.id, before, limit))
+    return to_page(result.all(), limit)
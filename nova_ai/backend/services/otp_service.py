@@ -4,12 +4,10 @@ from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import aiosmtplib
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models import OTP, User
 from ..config import settings
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def generate_otp(length=6):
     return ''.join(random.choices(string.digits, k=length))
@@ -38,28 +36,29 @@ async def send_email(email: str, subject: str, body: str):
         print(f"Failed to send email: {e}")
         # In production, you might want to raise an exception or log this more formally
 
-def create_otp(db: Session, user: User):
+async def create_otp(db: AsyncSession, user: User):
     otp_code = generate_otp()
     expires_at = datetime.utcnow() + timedelta(minutes=5)
 
     # Invalidate old unused OTPs
-    old_otps = db.query(OTP).filter(OTP.user_id == user.id, OTP.is_used == False).all()
-    for otp in old_otps:
-        otp.is_used = True # Mark as used/invalidated
+    await db.execute(
+        update(OTP).where(OTP.user_id == user.id, OTP.is_used == False).values(is_used=True)
+    )
 
     new_otp = OTP(user_id=user.id, otp_code=otp_code, expires_at=expires_at)
     db.add(new_otp)
-    db.commit()
-    db.refresh(new_otp)
+    await db.commit()
+    await db.refresh(new_otp)
     return new_otp
 
-def verify_otp(db: Session, user: User, otp_code: str, consume: bool = True):
+async def verify_otp(db: AsyncSession, user: User, otp_code: str, consume: bool = True):
     # Fetch the latest active OTP for the user
-    otp_record = db.query(OTP).filter(
+    result = await db.execute(select(OTP).where(
         OTP.user_id == user.id,
         OTP.is_used == False,
         OTP.expires_at > datetime.utcnow()
-    ).order_by(OTP.created_at.desc()).first()
+    ).order_by(OTP.created_at.desc()))
+    otp_record = result.scalars().first()
 
     if not otp_record:
         return False
@@ -69,11 +68,11 @@ def verify_otp(db: Session, user: User, otp_code: str, consume: bool = True):
 
     if otp_record.otp_code != otp_code:
         otp_record.attempts += 1
-        db.commit()
+        await db.commit()
         return False
 
     if consume:
         otp_record.is_used = True
-        db.commit()
+        await db.commit()
 
     return True
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+from ..config import settings
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+# The single hashing policy for the app. Pinning min/max rounds to the configured cost makes
+# passlib flag every hash made with a different cost, so logins rehash them transparently.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+class PasswordHasherBusyError(Exception):
+    def __init__(self, retry_after: int = 2):
+        super().__init__("Too many concurrent password operations, try again shortly")
+        self.retry_after = retry_after
+
+# Run inside the worker processes
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+_executor: ProcessPoolExecutor | None = None
+_pending = 0
+_lock = threading.Lock()
+
+def start() -> ProcessPoolExecutor:
+    # Returns the pool so callers never re-read the global, which shutdown() may clear meanwhile
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn: forking a process that already runs threads and an event loop is unsafe
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+def shutdown():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+async def _run(fn, *args):
+    global _pending
+    executor = start()
+    # Bounded backlog: beyond it callers are shed instead of queueing for seconds
+    with _lock:
+        if _pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE:
+            raise PasswordHasherBusyError()
+        _pending += 1
+    try:
+        return await asyncio.wrap_future(executor.submit(fn, *args))
+    finally:
+        with _lock:
+            _pending -= 1
+
+@metrics.timed("password_hash")
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+@metrics.timed("password_verify")
+async def verify_password(password: str, hashed_password: str):
+    # Returns (valid, new_hash); new_hash is set when the stored hash uses outdated parameters
+    return await _run(_verify_and_update, password, hashed_password)
+
+def pending() -> int:
+    return _pending
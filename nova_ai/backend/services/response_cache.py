@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from ..config import settings
+from .ollama_client import client
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_PRESENT = True
+except ImportError:
+    NUMPY_PRESENT = False
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+def context_digest(context: list[dict]) -> str:
+    return hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest()
+
+class SemanticCache:
+    # Nearest-neighbour lookup over normalized prompt embeddings, one matrix per (model, context)
+    def __init__(self, max_entries: int, ttl: float, threshold: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._partitions: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, partition: str, embedding):
+        with self._lock:
+            part = self._partitions.get(partition)
+            if part is None or not len(part["values"]):
+                return None
+            scores = part["matrix"] @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold or part["expires"][best] < time.monotonic():
+                return None
+            return part["values"][best]
+
+    def put(self, partition: str, embedding, value: str):
+        with self._lock:
+            part = self._partitions.get(partition)
+            if part is None:
+                part = {"matrix": np.empty((0, embedding.shape[0]), dtype=np.float32), "values": [], "expires": []}
+                self._partitions[partition] = part
+            if part["matrix"].shape[1] != embedding.shape[0]:
+                return  # embedding model changed dimensions
+            part["matrix"] = np.vstack([part["matrix"], embedding[None, :]])
+            part["values"].append(value)
+            part["expires"].append(time.monotonic() + self.ttl)
+            # Drop the oldest rows once the partition is full
+            overflow = len(part["values"]) - self.max_entries
+            if overflow > 0:
+                part["matrix"] = part["matrix"][overflow:]
+                del part["values"][:overflow]
+                del part["expires"][:overflow]
+
+    def __len__(self):
+        return sum(len(p["values"]) for p in self._partitions.values())
+
+class CacheLookup:
+    def __init__(self, key: str, partition: str, embedding=None, response: str | None = None, tier: str | None = None):
+        self.key = key
+        self.partition = partition
+        self.embedding = embedding
+        self.response = response
+        self.tier = tier
+
+class ResponseCache:
+    def __init__(self):
+        self.exact = TTLCache(settings.CHAT_CACHE_MAX_ENTRIES, settings.CHAT_CACHE_TTL)
+        self.semantic = None
+        if settings.CHAT_CACHE_SEMANTIC:
+            if NUMPY_PRESENT:
+                self.semantic = SemanticCache(
+                    settings.CHAT_CACHE_MAX_ENTRIES, settings.CHAT_CACHE_TTL, settings.CHAT_CACHE_SIMILARITY
+                )
+            else:
+                logger.warning("NumPy is not installed, semantic chat cache disabled.")
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self.bypassed = 0
+
+    async def _embed(self, text: str):
+        payload = {"model": settings.CHAT_CACHE_EMBED_MODEL, "prompt": text}
+        async with client.post("/embeddings", payload) as response:
+            if response.status != 200:
+                raise RuntimeError(f"Ollama returned status {response.status}")
+            result = await response.json()
+        vector = np.asarray(result["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, prompt: str, model: str, context: list[dict], bypass: bool = False) -> CacheLookup:
+        partition = f"{model}:{context_digest(context)}"
+        normalized = normalize_prompt(prompt)
+        lookup = CacheLookup(hashlib.sha256(f"{partition}:{normalized}".encode()).hexdigest(), partition)
+
+        if not settings.CHAT_CACHE_ENABLED:
+            return lookup
+        if bypass:
+            self.bypassed += 1
+            return lookup
+
+        lookup.response = self.exact.get(lookup.key)
+        if lookup.response is not None:
+            lookup.tier = "exact"
+            self.hits["exact"] += 1
+            return lookup
+
+        if self.semantic is not None:
+            try:
+                lookup.embedding = await self._embed(normalized)
+                lookup.response = self.semantic.get(partition, lookup.embedding)
+            except Exception as e:
+                logger.warning(f"Semantic cache lookup failed: {e}")
+            if lookup.response is not None:
+                lookup.tier = "semantic"
+                self.hits["semantic"] += 1
+                return lookup
+
+        self.misses += 1
+        return lookup
+
+    def store(self, lookup: CacheLookup, response: str):
+        if not settings.CHAT_CACHE_ENABLED or not response:
+            return
+        self.exact.put(lookup.key, response)
+        if self.semantic is not None and lookup.embedding is not None:
+            self.semantic.put(lookup.partition, lookup.embedding, response)
+
+    def stats(self):
+        lookups = self.hits["exact"] + self.hits["semantic"] + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": (self.hits["exact"] + self.hits["semantic"]) / lookups if lookups else 0.0,
+            "exact_entries": len(self.exact),
+            "semantic_entries": len(self.semantic) if self.semantic is not None else 0,
+        }
+
+cache = ResponseCache()
@@ -0,0 +1,56 @@
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+
+def static_url(path: str) -> str:
+    return "/static/" + os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+
+def static_path(url: str) -> str:
+    return os.path.join(STATIC_DIR, *url[len("/static/"):].split("/"))
+
+def touch(path: str):
+    # mtime doubles as "last used" for LRU eviction; atime is unreliable on noatime mounts
+    now = time.time()
+    os.utime(path, (now, now))
+
+def directory_usage(directory: str):
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+    return entries
+
+def evict_lru(directory: str, max_bytes: int, is_protected, on_evict=None, derived_size=None) -> int:
+    # Delete least recently used files until the directory fits in max_bytes.
+    # is_protected(path) vetoes files that are still referenced; on_evict(path) cleans up
+    # anything derived from an evicted file, and derived_size(path) counts those bytes
+    # against the file so they share its quota. Returns bytes freed.
+    if max_bytes <= 0 or not os.path.isdir(directory):
+        return 0
+    entries = directory_usage(directory)
+    if derived_size is not None:
+        entries = [(path, size + derived_size(path), mtime) for path, size, mtime in entries]
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for path, size, _ in sorted(entries, key=lambda e: e[2]):
+        if total - freed <= max_bytes:
+            break
+        if is_protected(path):
+            continue
+        try:
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            continue
+        if on_evict is not None:
+            on_evict(path)
+    if freed:
+        logger.info(f"Evicted {freed} bytes from {directory}")
+    return freed
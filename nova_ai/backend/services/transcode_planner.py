@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from ..config import settings
+from .filter_graph import Filter, FilterGraph
+
+logger = logging.getLogger(__name__)
+
+# Streams copied into our .mp4 outputs as-is must play in every browser: H.264 in 8-bit
+# 4:2:0 with AAC or MP3 audio. Anything else (HEVC, AV1, 10-bit, AC-3, ...) is re-encoded.
+MP4_VIDEO_CODECS = {"h264"}
+MP4_PIXEL_FORMATS = {"yuv420p", "yuvj420p"}
+MP4_AUDIO_CODECS = {"aac", "mp3"}
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    preset: str = "medium"
+    crf: int = 23
+
+# Operators pick one with VIDEO_SPEED_PROFILE; "balanced" is libx264's own default
+PROFILES = {
+    "quality": EncoderProfile(preset="slow", crf=20),
+    "balanced": EncoderProfile(),
+    "fast": EncoderProfile(preset="veryfast", crf=24),
+}
+PREVIEW_PROFILE = EncoderProfile(preset="ultrafast", crf=30)
+
+@dataclass(frozen=True)
+class MediaInfo:
+    duration: float | None
+    video_codec: str | None
+    width: int | None
+    height: int | None
+    audio_codec: str | None
+    pix_fmt: str | None = None
+
+@dataclass(frozen=True)
+class TranscodePlan:
+    media: MediaInfo | None
+    video_filter: str | None
+    audio_filter: str | None
+    copy_video: bool
+    copy_audio: bool
+    profile: EncoderProfile
+    duration: float | None  # expected output length
+    input_seconds: float | None = None  # only read this much of the input
+
+    def video_args(self, threads: int = 0) -> list[str]:
+        if self.copy_video:
+            return ["-c:v", "copy"]
+        args = ["-vf", self.video_filter] if self.video_filter else []
+        # 8-bit 4:2:0 even from 10-bit or 4:4:4 inputs, which libx264 would otherwise keep
+        args.extend(["-c:v", "libx264", "-preset", self.profile.preset, "-crf", str(self.profile.crf), "-pix_fmt", "yuv420p"])
+        if threads:
+            args.extend(["-threads", str(threads)])
+        return args
+
+    def audio_args(self) -> list[str]:
+        if self.copy_audio:
+            return ["-c:a", "copy"]
+        args = ["-af", self.audio_filter] if self.audio_filter else []
+        return args + ["-c:a", "aac"]
+
+async def probe(input_file_path: str) -> MediaInfo | None:
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "ffprobe", "-v", "error", "-show_entries", "stream=codec_type,codec_name,width,height,pix_fmt:format=duration",
+            "-of", "json", input_file_path,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+        stdout, _ = await proc.communicate()
+        info = json.loads(stdout or b"{}")
+    except (OSError, ValueError):
+        return None
+    if proc.returncode != 0:
+        return None
+
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    try:
+        duration = float(info.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    return MediaInfo(
+        duration, video.get("codec_name"), video.get("width"), video.get("height"), audio.get("codec_name"), video.get("pix_fmt"),
+    )
+
+def downscale_filter(media: MediaInfo | None) -> Filter | None:
+    # Bring oversized inputs down to the configured box (either orientation) before
+    # anything else runs, so later filters and the encoder touch fewer pixels
+    if media is None or not media.width or not media.height:
+        return None
+    long_side, short_side = max(settings.VIDEO_MAX_WIDTH, settings.VIDEO_MAX_HEIGHT), min(settings.VIDEO_MAX_WIDTH, settings.VIDEO_MAX_HEIGHT)
+    if max(media.width, media.height) <= long_side and min(media.width, media.height) <= short_side:
+        return None
+    box = (long_side, short_side) if media.width >= media.height else (short_side, long_side)
+    return Filter("scale", (("w", str(box[0])), ("h", str(box[1])), ("force_original_aspect_ratio", "decrease"), ("force_divisible_by", "2")))
+
+def _configured_profile() -> EncoderProfile:
+    if settings.VIDEO_SPEED_PROFILE not in PROFILES:
+        logger.warning(f"Unknown VIDEO_SPEED_PROFILE '{settings.VIDEO_SPEED_PROFILE}', using 'balanced'")
+    return PROFILES.get(settings.VIDEO_SPEED_PROFILE, PROFILES["balanced"])
+
+def encoder_settings() -> dict:
+    # Everything besides the input and the filter graph that changes the output
+    profile = _configured_profile()
+    return {
+        "preset": profile.preset,
+        "crf": profile.crf,
+        "max_size": [settings.VIDEO_MAX_WIDTH, settings.VIDEO_MAX_HEIGHT],
+        "copy": [sorted(MP4_VIDEO_CODECS), sorted(MP4_PIXEL_FORMATS), sorted(MP4_AUDIO_CODECS)],
+    }
+
+def plan(media: MediaInfo | None, graph: FilterGraph) -> TranscodePlan:
+    # Without probe data nothing can be copied safely, so fall back to a full re-encode.
+    # Oversized video is re-encoded too so the downscale still applies.
+    copy_video = (
+        graph.video is None and media is not None and media.video_codec in MP4_VIDEO_CODECS
+        and media.pix_fmt in MP4_PIXEL_FORMATS and downscale_filter(media) is None
+    )
+    copy_audio = graph.audio is None and media is not None and (media.audio_codec is None or media.audio_codec in MP4_AUDIO_CODECS)
+
+    duration = media.duration * graph.speed if media is not None and media.duration else None
+    return TranscodePlan(
+        media=media,
+        video_filter=None if copy_video else graph.video_filter(downscale_filter(media)),
+        audio_filter=graph.audio,
+        copy_video=copy_video,
+        copy_audio=copy_audio,
+        profile=_configured_profile(),
+        duration=duration,
+    )
+
+def preview_plan(media: MediaInfo | None, graph: FilterGraph) -> TranscodePlan:
+    # The first VIDEO_PREVIEW_SECONDS at low resolution with the cheapest encoder settings;
+    # always re-encoded so the preview looks like the final render
+    scale = None
+    if media is None or not media.height or media.height > settings.VIDEO_PREVIEW_HEIGHT:
+        scale = Filter("scale", (("w", "-2"), ("h", str(settings.VIDEO_PREVIEW_HEIGHT))))
+    seconds = settings.VIDEO_PREVIEW_SECONDS
+    if media is not None and media.duration:
+        seconds = min(seconds, media.duration)
+    return TranscodePlan(
+        media=media,
+        video_filter=graph.video_filter(scale),
+        audio_filter=graph.audio,
+        copy_video=False,
+        copy_audio=False,
+        profile=PREVIEW_PROFILE,
+        duration=seconds * graph.speed,
+        input_seconds=seconds,
+    )
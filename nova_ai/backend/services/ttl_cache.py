@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    # Thread-safe LRU where every entry also expires `ttl` seconds after it was stored.
+    # on_evict(key, value) runs, outside the lock, for entries dropped by expiry or by the size bound.
+    def __init__(self, max_entries: int, ttl: float, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.misses += 1
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+        return None
+
+    def put(self, key, value, ttl: float | None = None):
+        evicted = []
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+        if self.on_evict is not None:
+            for old_key, (_, old_value) in evicted:
+                self.on_evict(old_key, old_value)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._entries)
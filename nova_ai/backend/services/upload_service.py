@@ -0,0 +1,174 @@
+import asyncio
+import glob
+import hashlib
+import os
+import re
+import time
+import uuid
+import logging
+from fastapi.concurrency import run_in_threadpool
+from ..config import settings
+from . import storage, video_service
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_DIR = os.path.join(video_service.UPLOAD_DIR, "partial")
+# Finished uploads are named after their content hash, so identical files share one copy
+UPLOAD_NAME = re.compile(r"[0-9a-f]{64}\.[a-z0-9]{1,8}")
+WRITE_BUFFER = 1024 * 1024  # bytes gathered before each disk write
+
+class UploadTooLargeError(Exception):
+    def __init__(self):
+        super().__init__(f"Upload exceeds the {settings.VIDEO_MAX_UPLOAD_BYTES} byte limit")
+
+class UploadOffsetError(Exception):
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+class UploadSession:
+    def __init__(self, user_id: int, extension: str, size: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.extension = extension
+        self.size = size
+        self.offset = 0
+        self.path = os.path.join(PARTIAL_DIR, self.id)
+        self.hasher = hashlib.sha256()
+        self.lock = asyncio.Lock()
+        self.upload = None  # final file name once complete
+        self.deduplicated = False
+
+    def to_dict(self):
+        return {
+            "upload_id": self.id,
+            "offset": self.offset,
+            "size": self.size,
+            "complete": self.upload is not None,
+            "upload": self.upload,
+            "deduplicated": self.deduplicated,
+        }
+
+def _discard(upload_id: str, session: UploadSession):
+    # The partial file can't be resumed without its session (and running hash).
+    # A session still receiving data is left to _prune_partials.
+    if session.upload is None and not session.lock.locked() and os.path.exists(session.path):
+        os.remove(session.path)
+        logger.info(f"Upload session {upload_id} expired, removed its partial file")
+
+# Partial data lives on disk; the session (and its running hash) only in this process,
+# so a session is lost on restart, on another worker, or when it is evicted here
+_sessions = TTLCache(1024, settings.VIDEO_UPLOAD_TTL, on_evict=_discard)
+
+def extension_for(filename: str | None) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if re.fullmatch(r"\.[a-z0-9]{1,8}", extension) else ".mp4" # Default extension if missing
+
+def _prune_partials():
+    cutoff = time.time() - settings.VIDEO_UPLOAD_TTL
+    for entry in os.scandir(PARTIAL_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+def create(user_id: int, filename: str | None, size: int) -> UploadSession:
+    if size > settings.VIDEO_MAX_UPLOAD_BYTES:
+        raise UploadTooLargeError()
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+    _prune_partials()
+    session = UploadSession(user_id, extension_for(filename), size)
+    open(session.path, "wb").close()
+    _sessions.put(session.id, session)
+    return session
+
+def get(upload_id: str, user_id: int) -> UploadSession | None:
+    session = _sessions.get(upload_id)
+    if session is None or session.user_id != user_id:
+        return None
+    return session
+
+def resolve(upload: str) -> str | None:
+    # Path of a finished upload, or None for unknown or malformed names.
+    # Marks it as used so previewing keeps it around for the full render.
+    # There is deliberately no ownership check: uploads are deduplicated across users, so
+    # one file can belong to many. The name is the SHA-256 of the content, so it can only
+    # be used by someone who has the bytes or was given the name.
+    if not UPLOAD_NAME.fullmatch(upload or ""):
+        return None
+    path = os.path.join(video_service.UPLOAD_DIR, upload)
+    try:
+        storage.touch(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def _write(f, session: UploadSession, data: bytes):
+    f.write(data)
+    session.hasher.update(data)
+    session.offset += len(data)
+
+def _finalize(session: UploadSession):
+    digest = session.hasher.hexdigest()
+    # Same bytes under another extension still count as a duplicate; ffmpeg probes the content
+    existing = glob.glob(os.path.join(video_service.UPLOAD_DIR, f"{digest}.*"))
+    final_path = existing[0] if existing else os.path.join(video_service.UPLOAD_DIR, digest + session.extension)
+    session.upload = os.path.basename(final_path)
+    if existing:
+        os.remove(session.path)
+        storage.touch(final_path)
+        session.deduplicated = True
+    else:
+        os.replace(session.path, final_path)
+    _sessions.pop(session.id)
+    logger.info(f"Upload {session.id} complete: {session.upload} ({session.offset} bytes, deduplicated={session.deduplicated})")
+
+async def append(session: UploadSession, offset: int, chunks, final: bool = False) -> UploadSession:
+    # Streams chunks straight into the partial file, hashing as they arrive. Whatever was
+    # received before a disconnect is kept, so the client can resume from session.offset.
+    async with session.lock:
+        if session.upload is not None or offset != session.offset:
+            raise UploadOffsetError(session.offset)
+        buffer = bytearray()
+        f = await run_in_threadpool(open, session.path, "ab")
+        try:
+            async for chunk in chunks:
+                if session.offset + len(buffer) + len(chunk) > session.size:
+                    raise UploadTooLargeError()
+                buffer += chunk
+                if len(buffer) >= WRITE_BUFFER:
+                    await run_in_threadpool(_write, f, session, bytes(buffer))
+                    buffer.clear()
+        finally:
+            if buffer:
+                await run_in_threadpool(_write, f, session, bytes(buffer))
+            await run_in_threadpool(f.close)
+        if final or session.offset == session.size:
+            await run_in_threadpool(_finalize, session)
+        else:
+            # Every chunk restarts the TTL, so only idle uploads expire
+            _sessions.put(session.id, session)
+    return session
+
+def _remove_partial(session: UploadSession):
+    if os.path.exists(session.path):
+        os.remove(session.path)
+
+async def store(user_id: int, file) -> str:
+    # Single-request path for multipart UploadFile bodies; returns the final file name.
+    # The multipart parser has already spooled the body, so this copies it once more;
+    # large files should use the resumable /video/uploads endpoints instead.
+    session = await run_in_threadpool(
+        create, user_id, file.filename, file.size if file.size is not None else settings.VIDEO_MAX_UPLOAD_BYTES,
+    )
+
+    async def chunks():
+        while data := await file.read(WRITE_BUFFER):
+            yield data
+
+    try:
+        await append(session, 0, chunks(), final=True)
+    except Exception:
+        _sessions.pop(session.id)
+        await run_in_threadpool(_remove_partial, session)
+        raise
+    return session.upload
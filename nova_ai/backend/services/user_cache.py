@@ -0,0 +1,67 @@
+import time
+from dataclasses import dataclass
+from sqlalchemy import event, inspect
+from ..config import settings
+from ..models import User
+from .ttl_cache import TTLCache
+
+@dataclass(frozen=True)
+class Principal:
+    # What protected routes need from the authenticated user, detached from any DB session
+    id: int
+    username: str
+    email: str
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: User):
+        return cls(id=user.id, username=user.username, email=user.email, is_active=user.is_active)
+
+# token -> (subject, exp): skips signature verification for tokens we have already checked
+_tokens = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL)
+# username -> Principal: skips the users table lookup
+_principals = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL)
+
+def get_subject(token: str) -> str | None:
+    if not settings.AUTH_CACHE_ENABLED:
+        return None
+    entry = _tokens.get(token)
+    if entry is None:
+        return None
+    subject, expires_at = entry
+    if expires_at is not None and expires_at <= time.time():
+        _tokens.pop(token)
+        return None
+    return subject
+
+def remember_token(token: str, subject: str, expires_at: float | None):
+    if settings.AUTH_CACHE_ENABLED:
+        _tokens.put(token, (subject, expires_at))
+
+def get_principal(username: str) -> Principal | None:
+    if not settings.AUTH_CACHE_ENABLED:
+        return None
+    return _principals.get(username)
+
+def remember_principal(principal: Principal):
+    if settings.AUTH_CACHE_ENABLED:
+        _principals.put(principal.username, principal)
+
+def invalidate(username: str):
+    _principals.pop(username)
+
+def stats():
+    return {"tokens": _tokens.stats(), "principals": _principals.stats()}
+
+def clear():
+    _tokens.clear()
+    _principals.clear()
+
+# Any ORM update or delete of a user (password reset, deactivation, ...) drops the cached
+# principal in this process. Other workers pick the change up within AUTH_CACHE_TTL.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    invalidate(target.username)
+    for old_username in inspect(target).attrs.username.history.deleted or ():
+        invalidate(old_username)
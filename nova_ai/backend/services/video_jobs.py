@@ -0,0 +1,136 @@
+import os
+import time
+import logging
+from ..config import settings
+from .. import metrics
+from fastapi.concurrency import run_in_threadpool
+from . import storage, video_service, video_store, transcode_planner
+from .job_queue import Job, JobQueue, JobQueueFullError
+
+logger = logging.getLogger(__name__)
+
+class VideoJob(Job):
+    RUNNING = "processing"  # matches VideoLog.status
+
+    def __init__(self, user, log_id: int, input_file_path: str, prompt: str, cache_key: str, priority: int = 0):
+        super().__init__(user, priority)
+        self.log_id = log_id
+        self.cache_key = cache_key
+        self.input_file_path = input_file_path
+        self.prompt = prompt
+        self.duration = None  # expected output length in seconds, once probed
+        self.position = 0.0
+        self.output_url = None
+        self.partial_path = None  # where ffmpeg writes until the render succeeds
+        self.processes = set()  # running ffmpeg processes; several when encoding in segments
+
+    @property
+    def progress(self) -> float:
+        if self.status == "completed":
+            return 1.0
+        if not self.duration:
+            return 0.0
+        return min(self.position / self.duration, 1.0)
+
+    @property
+    def eta(self) -> float | None:
+        progress = self.progress
+        if self.status != self.RUNNING or progress <= 0:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed / progress * (1 - progress)
+
+    def on_progress(self, position: float):
+        self.position = position
+
+    def on_start(self, process):
+        self.processes.add(process)
+        if self.cancel_event.is_set():
+            process.kill()
+
+    def to_dict(self):
+        return {
+            **super().to_dict(),
+            "prompt": self.prompt,
+            "progress": self.progress,
+            "eta_seconds": self.eta,
+            "video_id": self.log_id,
+            "output_url": self.output_url,
+        }
+
+class VideoJobQueue(JobQueue):
+    # Workers default to a quarter of the cores and each job gets an even share of threads
+    # (split again between its segments), so concurrent jobs don't oversubscribe the CPU.
+    kind = "Video"
+    failure_message = "Video processing failed"
+
+    def __init__(self):
+        super().__init__(settings.VIDEO_WORKERS, settings.VIDEO_QUEUE_MAX, settings.VIDEO_JOB_TTL)
+        self.threads_per_job = max(1, (os.cpu_count() or 1) // self.workers)
+
+    def submit(self, user, log_id: int, input_file_path: str, prompt: str, cache_key: str, priority: int = 0) -> VideoJob:
+        return self.enqueue(VideoJob(user, log_id, input_file_path, prompt, cache_key, priority))
+
+    async def enforce_quota(self):
+        active = [job for job in self.jobs.values() if not job.finished]
+        active_inputs = {job.input_file_path for job in active}
+        active_partials = {job.partial_path for job in active if job.partial_path}
+        await run_in_threadpool(video_store.enforce_quota, active_inputs, active_partials)
+
+    def on_cancel(self, job: VideoJob):
+        super().on_cancel(job)
+        for process in job.processes:
+            if process.returncode is None:
+                process.kill()
+
+    async def on_interrupted(self, job: VideoJob):
+        await video_service.update_log(job.log_id, status=job.status)
+
+    @metrics.timed("process_video")
+    async def execute(self, job: VideoJob):
+        try:
+            await self._run(job)
+        except FileNotFoundError:
+            logger.error("FFmpeg not found. Please install FFmpeg.")
+            await video_service.update_log(job.log_id, status="failed")
+            raise
+        except Exception:
+            await video_service.update_log(job.log_id, status="failed")
+            raise
+        finally:
+            # Left over unless the render succeeded and was renamed
+            if job.partial_path and os.path.exists(job.partial_path):
+                os.remove(job.partial_path)
+        await self.enforce_quota()
+
+    async def _run(self, job: VideoJob):
+        await video_service.update_log(job.log_id, status="processing")
+        os.makedirs(video_service.OUTPUT_DIR, exist_ok=True)
+        final_path = video_store.path_for(job.cache_key)
+        output_path = job.partial_path = video_store.partial_path_for(job.cache_key, job.id)
+
+        graph = video_service.parse_prompt(job.prompt)
+        media = await transcode_planner.probe(job.input_file_path)
+        plan = transcode_planner.plan(media, graph)
+        job.duration = plan.duration
+
+        returncode, stderr = await video_service.transcode(
+            job.input_file_path, output_path, plan, self.threads_per_job, job.on_progress, job.on_start,
+        )
+        job.processes.clear()
+
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+            await video_service.update_log(job.log_id, status="cancelled")
+        elif returncode == 0:
+            os.replace(output_path, final_path)
+            job.output_url = storage.static_url(final_path)
+            job.status = "completed"
+            await video_service.update_log(job.log_id, status="completed", output_file=job.output_url)
+        else:
+            logger.error(f"FFmpeg error: {stderr}")
+            job.status = "failed"
+            job.error = self.failure_message
+            await video_service.update_log(job.log_id, status="failed")
+
+jobs = VideoJobQueue()
@@ -1,76 +1,216 @@
-import subprocess
+import asyncio
 import os
+import shutil
+import tempfile
 import uuid
 import logging
+from collections import Counter, deque
 from ..models import VideoLog
+from ..database import AsyncSessionLocal
+from ..config import settings
+from .. import write_behind, metrics
+from . import storage, filter_graph, transcode_planner
+from .filter_graph import FilterGraph
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
-FILTER_MAP = {
-    "vintage": "curves=vintage",
-    "black and white": "hue=s=0",
-    "grayscale": "hue=s=0",
-    "increase brightness": "eq=brightness=0.3",
-    "decrease brightness": "eq=brightness=-0.3",
-    "cinematic": "crop=iw:ih-140,eq=saturation=1.2:contrast=1.2", # basic cinematic look
-    "slow motion": "setpts=2.0*PTS",
-    "fast motion": "setpts=0.5*PTS",
-    "blur": "boxblur=10:1",
-    "sharpen": "unsharp=5:5:1.0:5:5:0.0",
-}
-
-def parse_prompt(prompt: str):
-    filters = []
-    prompt = prompt.lower()
-    for key, value in FILTER_MAP.items():
-        if key in prompt:
-            filters.append(value)
-
-    if not filters:
-        return None
-    return ",".join(filters)
-
-def process_video(db: Session, user, input_file_path: str, prompt: str):
-    # Ensure output directory exists
-    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    output_dir = os.path.join(base_dir, "static", "videos")
-    os.makedirs(output_dir, exist_ok=True)
-
-    output_filename = f"{uuid.uuid4()}.mp4"
-    output_path = os.path.join(output_dir, output_filename)
-    relative_path = f"/static/videos/{output_filename}"
-
-    filter_chain = parse_prompt(prompt)
-
-    cmd = ["ffmpeg", "-y", "-i", input_file_path]
-
-    if filter_chain:
-        cmd.extend(["-vf", filter_chain])
-
-    cmd.extend(["-c:v", "libx264", "-c:a", "aac", output_path])
+OUTPUT_DIR = os.path.join(storage.STATIC_DIR, "videos")
+UPLOAD_DIR = os.path.join(OUTPUT_DIR, "uploads")
+PREVIEW_DIR = os.path.join(OUTPUT_DIR, "previews")
 
-    try:
-        logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        status = "completed"
-    except subprocess.CalledProcessError as e:
-        logger.error(f"FFmpeg error: {e.stderr.decode()}")
-        status = "failed"
-    except FileNotFoundError:
-        logger.error("FFmpeg not found. Please install FFmpeg.")
-        status = "failed"
-
-    # Log to DB
-    log = VideoLog(
-        user_id=user.id,
-        command=prompt,
-        input_file=input_file_path,
-        output_file=relative_path if status == "completed" else None,
-        status=status
+# Previews skip the job queue so they come back quickly; this keeps them from piling up
+_preview_slots = asyncio.Semaphore(settings.VIDEO_PREVIEW_CONCURRENCY)
+# Inputs with a preview in progress (waiting or encoding), so quota eviction leaves them alone
+previewing = Counter()
+
+def parse_prompt(prompt: str) -> FilterGraph:
+    # Keywords compile to an ordered, fused graph; see services/filter_graph.py
+    return filter_graph.compile_prompt(prompt)
+
+def build_command(input_file_path: str, output_path: str, plan, threads: int = 0):
+    # -progress writes key=value lines to stdout; -nostats keeps stderr down to errors
+    cmd = ["ffmpeg", "-y", "-nostdin", "-nostats", "-progress", "pipe:1"]
+    if plan.input_seconds is not None:
+        cmd.extend(["-t", f"{plan.input_seconds:g}"])
+    cmd.extend(["-i", input_file_path])
+    cmd.extend(plan.video_args(threads))
+    cmd.extend(plan.audio_args())
+    cmd.append(output_path)
+    return cmd
+
+async def run_ffmpeg(cmd: list[str], on_progress=None, on_start=None):
+    # Runs ffmpeg without blocking the event loop. on_progress(seconds) receives the
+    # output position; on_start(process) lets callers kill it. Returns (returncode, stderr tail).
+    logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
     )
+    if on_start is not None:
+        on_start(proc)
+    stderr_tail = deque(maxlen=20)
+
+    async def read_progress():
+        async for line in proc.stdout:
+            key, _, value = line.decode(errors="replace").strip().partition("=")
+            # out_time_ms is in microseconds too, despite the name
+            if key in ("out_time_us", "out_time_ms") and value.isdigit() and on_progress is not None:
+                on_progress(int(value) / 1_000_000)
+
+    async def read_errors():
+        async for line in proc.stderr:
+            stderr_tail.append(line.decode(errors="replace").rstrip())
+
+    try:
+        await asyncio.gather(read_progress(), read_errors())
+        await proc.wait()
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    return proc.returncode, "\n".join(stderr_tail)
+
+async def probe_keyframes(input_file_path: str) -> list[float]:
+    # Keyframe timestamps of the first video stream; only keyframes are decoded, so this is quick
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+            "-show_entries", "frame=pts_time", "-of", "csv=p=0", input_file_path,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+        stdout, _ = await proc.communicate()
+    except OSError:
+        return []
+    keyframes = []
+    for line in stdout.decode().splitlines():
+        try:
+            keyframes.append(float(line.strip().rstrip(",")))
+        except ValueError:
+            continue
+    return keyframes
+
+def plan_segments(duration: float, keyframes: list[float], count: int) -> list[tuple[float, float | None]]:
+    # Cut at the keyframe nearest each even split point so every segment decodes on its own.
+    # The last segment is open-ended so no trailing frames are lost.
+    cuts = []
+    for i in range(1, count):
+        target = duration * i / count
+        cut = min(keyframes, key=lambda k: abs(k - target), default=None)
+        if cut and cut not in cuts and (not cuts or cut > cuts[-1]):
+            cuts.append(cut)
+    bounds = [0.0] + cuts
+    return [(start, bounds[i + 1] if i + 1 < len(bounds) else None) for i, start in enumerate(bounds)]
+
+async def _transcode_segments(input_file_path, output_path, plan, segments, threads, on_progress, on_start):
+    workdir = tempfile.mkdtemp(prefix="nova-segments-")
+    positions = [0.0] * len(segments)
+    segment_threads = max(1, threads // len(segments))
+
+    def segment_progress(index):
+        def report(position):
+            positions[index] = position
+            if on_progress is not None:
+                on_progress(sum(positions))
+        return report
+
+    try:
+        # Video only: input seeking resets timestamps to zero per segment, so setpts
+        # scales each piece independently and the concat lines them up again
+        commands = []
+        for index, (start, end) in enumerate(segments):
+            segment_path = os.path.join(workdir, f"{index:04d}.mp4")
+            cmd = ["ffmpeg", "-y", "-nostdin", "-nostats", "-progress", "pipe:1", "-ss", f"{start:.6f}"]
+            if end is not None:
+                cmd.extend(["-to", f"{end:.6f}"])
+            cmd.extend(["-i", input_file_path, "-an", *plan.video_args(segment_threads), segment_path])
+            commands.append((segment_path, cmd))
+
+        results = await asyncio.gather(*(
+            run_ffmpeg(cmd, segment_progress(index), on_start) for index, (_, cmd) in enumerate(commands)
+        ))
+        for returncode, stderr in results:
+            if returncode != 0:
+                return returncode, stderr
+
+        list_path = os.path.join(workdir, "segments.txt")
+        with open(list_path, "w") as f:
+            for segment_path, _ in commands:
+                f.write(f"file '{segment_path}'\n")
+
+        # Stream-copy the encoded video back together; audio is handled once from the source
+        cmd = [
+            "ffmpeg", "-y", "-nostdin", "-nostats", "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", input_file_path, "-map", "0:v:0", "-map", "1:a?", "-c:v", "copy", *plan.audio_args(), output_path,
+        ]
+        return await run_ffmpeg(cmd, on_start=on_start)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+@metrics.timed("video_transcode")
+async def transcode(input_file_path: str, output_path: str, plan, threads: int = 0, on_progress=None, on_start=None):
+    # Long re-encodes are split at keyframes and the segments encoded concurrently;
+    # stream copies, short clips and inputs we can't probe take the single-pass path.
+    # There are never more segments than threads: on one core splitting only adds overhead.
+    segments = []
+    cores = threads or (os.cpu_count() or 1)
+    count = min(settings.VIDEO_PARALLEL_SEGMENTS, cores)
+    duration = plan.media.duration if plan.media is not None else None
+    if not plan.copy_video and count > 1 and duration and duration >= settings.VIDEO_PARALLEL_MIN_SECONDS:
+        keyframes = await probe_keyframes(input_file_path)
+        segments = plan_segments(duration, keyframes, count)
+    if len(segments) > 1:
+        logger.info(f"Transcoding {input_file_path} in {len(segments)} segments")
+        return await _transcode_segments(input_file_path, output_path, plan, segments, cores, on_progress, on_start)
+    cmd = build_command(input_file_path, output_path, plan, threads)
+    return await run_ffmpeg(cmd, on_progress, on_start)
+
+@metrics.timed("video_preview")
+async def render_preview(input_file_path: str, prompt: str) -> str | None:
+    # Returns the preview's /static URL, or None if ffmpeg failed. VIDEO_PREVIEW_TIMEOUT
+    # covers the whole request (probe, waiting for a slot and the encode) and raises TimeoutError.
+    return await asyncio.wait_for(_render_preview(input_file_path, prompt), settings.VIDEO_PREVIEW_TIMEOUT)
+
+async def _render_preview(input_file_path: str, prompt: str) -> str | None:
+    previewing[input_file_path] += 1
+    try:
+        return await _encode_preview(input_file_path, prompt)
+    finally:
+        previewing[input_file_path] -= 1
+        if not previewing[input_file_path]:
+            del previewing[input_file_path]
+
+async def _encode_preview(input_file_path: str, prompt: str) -> str | None:
+    plan = transcode_planner.preview_plan(await transcode_planner.probe(input_file_path), parse_prompt(prompt))
+    async with _preview_slots:
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        output_path = os.path.join(PREVIEW_DIR, f"{uuid.uuid4()}.mp4")
+        succeeded = False
+        try:
+            returncode, stderr = await run_ffmpeg(build_command(input_file_path, output_path, plan))
+            if returncode != 0:
+                logger.error(f"FFmpeg preview error: {stderr}")
+                return None
+            succeeded = True
+            return storage.static_url(output_path)
+        finally:
+            # Failed, timed out or cancelled encodes leave nothing behind
+            if not succeeded and os.path.exists(output_path):
+                os.remove(output_path)
+
+def create_log(db: Session, user, input_file_path: str, prompt: str, status: str = "queued", output_file: str | None = None):
+    log = VideoLog(user_id=user.id, command=prompt, input_file=input_file_path, status=status, output_file=output_file)
+    if write_behind.enabled():
+        # Grouped with other pending inserts; wait for the commit so the id can be returned
+        write_behind.writer.submit(log).result()
+        return log
+
     db.add(log)
     db.commit()
     db.refresh(log)
-
     return log
+
+async def update_log(log_id: int, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(VideoLog).where(VideoLog.id == log_id).values(**values))
+        await db.commit()
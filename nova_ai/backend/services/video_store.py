@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import re
+import time
+import logging
+from sqlalchemy import update
+from ..config import settings
+from ..database import SessionLocal
+from ..models import VideoLog
+from . import storage, video_service, transcode_planner
+from .filter_graph import FilterGraph
+
+logger = logging.getLogger(__name__)
+
+def input_digest(input_file_path: str) -> str:
+    # Uploads are already named after their sha256; anything else is hashed here
+    stem = os.path.splitext(os.path.basename(input_file_path))[0]
+    if re.fullmatch(r"[0-9a-f]{64}", stem):
+        return stem
+    with open(input_file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+def cache_key(input_file_path: str, graph: FilterGraph) -> str:
+    # Same bytes + same compiled graph + same encoder settings = same output
+    payload = json.dumps({
+        "input": input_digest(input_file_path),
+        "graph": graph.key,
+        "encoder": transcode_planner.encoder_settings(),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+PARTIAL_SUFFIX = ".partial.mp4"
+# Renders write their partial file continuously, so one this old without a job is left over from a crash
+ORPHAN_PARTIAL_AGE = 60
+
+def path_for(key: str) -> str:
+    return os.path.join(video_service.OUTPUT_DIR, f"{key}.mp4")
+
+def partial_path_for(key: str, job_id: str) -> str:
+    # ffmpeg writes here and the file is renamed only once the render succeeded. Per job,
+    # so identical renders running at once never write to or delete each other's output.
+    return os.path.join(video_service.OUTPUT_DIR, f"{key}.{job_id}{PARTIAL_SUFFIX}")
+
+def lookup(key: str) -> str | None:
+    filepath = path_for(key)
+    if not os.path.exists(filepath):
+        return None
+    storage.touch(filepath)
+    return storage.static_url(filepath)
+
+def expire_partials(active_partials: set[str]) -> int:
+    # Partials of failed or crashed renders would otherwise never be evicted
+    freed = 0
+    if not os.path.isdir(video_service.OUTPUT_DIR):
+        return freed
+    cutoff = time.time() - ORPHAN_PARTIAL_AGE
+    for path, size, mtime in storage.directory_usage(video_service.OUTPUT_DIR):
+        if path.endswith(PARTIAL_SUFFIX) and path not in active_partials and mtime < cutoff:
+            try:
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                continue
+    if freed:
+        logger.info(f"Removed {freed} bytes of abandoned partial renders")
+    return freed
+
+def enforce_quota(active_inputs: set[str], active_partials: set[str]):
+    # Unlike generated images, videos are too big to keep for every history row: the
+    # least recently used outputs go, and their rows are marked expired. Fresh files,
+    # renders in progress and inputs of queued/running jobs are never touched.
+    def is_protected(path):
+        return (
+            time.time() - os.path.getmtime(path) < 60
+            or path in active_partials
+            or path in active_inputs
+        )
+
+    def expire_logs(path):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(VideoLog).where(VideoLog.output_file == storage.static_url(path)).values(output_file=None, status="expired")
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    freed = expire_partials(active_partials)
+    freed += storage.evict_lru(video_service.OUTPUT_DIR, settings.VIDEO_OUTPUT_QUOTA_BYTES, is_protected, expire_logs)
+    freed += storage.evict_lru(video_service.PREVIEW_DIR, settings.VIDEO_PREVIEW_QUOTA_BYTES, is_protected)
+    # Uploads are touched whenever they are uploaded, previewed or rendered. Over quota, only
+    # those of queued/running jobs and previews in progress stay, plus any used within
+    # VIDEO_UPLOAD_GRACE, which covers a client starting the full render after its preview.
+    def upload_in_use(path):
+        return (
+            is_protected(path)
+            or path in video_service.previewing
+            or time.time() - os.path.getmtime(path) < settings.VIDEO_UPLOAD_GRACE
+        )
+
+    freed += storage.evict_lru(video_service.UPLOAD_DIR, settings.VIDEO_UPLOAD_QUOTA_BYTES, upload_in_use)
+    return freed
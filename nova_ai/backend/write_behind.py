@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy.orm import sessionmaker
+from .config import settings
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class WriteBehindQueue:
+    # Collects ORM inserts from any thread or coroutine and commits them in batches
+    # from a single writer thread, so N rows cost one transaction instead of N.
+
+    def __init__(self, bind, batch_size: int, interval: float):
+        self._session_factory = sessionmaker(bind=bind, autoflush=False, expire_on_commit=False)
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Drains everything already queued before returning
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, obj) -> Future:
+        # The future resolves once the row is committed; the object then has its primary key
+        future = Future()
+        self._queue.put((obj, future))
+        return future
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+        # Flush whatever arrived after the stop marker
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._commit(leftover)
+
+    def _commit(self, batch):
+        db = self._session_factory()
+        try:
+            db.add_all([obj for obj, _ in batch])
+            db.commit()
+            for _, future in batch:
+                future.set_result(True)
+            return
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Batched insert of {len(batch)} rows failed, retrying one by one: {e}")
+        finally:
+            db.close()
+
+        # Isolate the bad rows so one failure does not drop the whole batch
+        for obj, future in batch:
+            db = self._session_factory()
+            try:
+                db.add(obj)
+                db.commit()
+                future.set_result(True)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Insert of {obj!r} failed: {e}")
+                future.set_exception(e)
+            finally:
+                db.close()
+
+writer = WriteBehindQueue(engine, settings.DB_WRITE_BEHIND_BATCH, settings.DB_WRITE_BEHIND_INTERVAL)
+
+def enabled() -> bool:
+    return settings.DB_WRITE_BEHIND and writer.running
@@ -0,0 +1,44 @@
+# Per-request cost of get_current_user with and without the token/principal cache.
+# Run from the nova_ai directory: python -m benchmarks.bench_auth [requests]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+from backend.config import settings
+from backend.database import Base, engine, AsyncSessionLocal, SessionLocal
+from backend.models import User
+from backend.routers.auth import create_access_token, get_current_user
+from backend.services import user_cache
+
+async def measure(token, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        # A fresh session per call, like the get_async_db dependency
+        async with AsyncSessionLocal() as db:
+            await get_current_user(token, db)
+    return (time.perf_counter() - start) / requests
+
+async def main(requests):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(User(username="bench", email="bench@example.com", hashed_password="x"))
+    db.commit()
+    db.close()
+    token = create_access_token({"sub": "bench"})
+
+    settings.AUTH_CACHE_ENABLED = False
+    uncached = await measure(token, requests)
+    settings.AUTH_CACHE_ENABLED = True
+    user_cache.clear()
+    cached = await measure(token, requests)
+
+    print(f"without cache {uncached * 1e6:>8.1f} us/request")
+    print(f"with cache    {cached * 1e6:>8.1f} us/request")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
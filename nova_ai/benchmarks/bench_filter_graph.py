@@ -0,0 +1,48 @@
+# Encode time of the old keyword-joined filter chains vs the compiled filter graphs.
+# Needs ffmpeg on PATH; the compiled graphs are checked in tests/test_filter_graph.py.
+# Run from the nova_ai directory:
+#   python -m benchmarks.bench_filter_graph [seconds]
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from backend.services import video_service
+from backend.services.filter_graph import compile_prompt
+from benchmarks.bench_video_parallel import make_clip
+
+# The chains parse_prompt used to build by joining FILTER_MAP values in table order
+OLD_CHAINS = {
+    "cinematic increase brightness": "eq=brightness=0.3,crop=iw:ih-140,eq=saturation=1.2:contrast=1.2",
+    "slow motion fast motion": "setpts=2.0*PTS,setpts=0.5*PTS",
+    "black and white grayscale blur": "hue=s=0,hue=s=0,boxblur=10:1",
+    "vintage cinematic sharpen": "curves=vintage,crop=iw:ih-140,eq=saturation=1.2:contrast=1.2,unsharp=5:5:1.0:5:5:0.0",
+}
+
+async def timed(clip, output_path, video_filter):
+    cmd = ["ffmpeg", "-y", "-nostdin", "-v", "error", "-i", clip]
+    if video_filter:
+        cmd.extend(["-vf", video_filter])
+    cmd.extend(["-an", "-c:v", "libx264", output_path])
+    start = time.perf_counter()
+    returncode, stderr = await video_service.run_ffmpeg(cmd)
+    if returncode != 0:
+        raise RuntimeError(stderr)
+    return time.perf_counter() - start
+
+async def main(seconds):
+    if shutil.which("ffmpeg") is None:
+        print("ffmpeg not found")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = os.path.join(tmp, "input.mp4")
+        make_clip(clip, seconds)
+        for prompt, old_chain in OLD_CHAINS.items():
+            before = await timed(clip, os.path.join(tmp, "before.mp4"), old_chain)
+            after = await timed(clip, os.path.join(tmp, "after.mp4"), compile_prompt(prompt).video)
+            print(f"{prompt!r:<34} {before:>7.2f} s -> {after:>7.2f} s")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 30))
@@ -0,0 +1,48 @@
+# Chat-log insert throughput: default SQLite vs production pragmas vs write-behind batching.
+# Run from the nova_ai directory: python -m benchmarks.bench_sqlite_writes [rows]
+import os
+import sys
+import tempfile
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from backend.database import Base, apply_sqlite_pragmas
+from backend.models import Chat
+from backend.write_behind import WriteBehindQueue
+
+def make_engine(path, production):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if production:
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+def per_row_commits(engine, rows):
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    for i in range(rows):
+        db.add(Chat(user_id=1, role="user", content=f"message {i}", model="tinyllama"))
+        db.commit()
+    db.close()
+
+def write_behind(engine, rows):
+    writer = WriteBehindQueue(engine, batch_size=200, interval=0.05)
+    writer.start()
+    for i in range(rows):
+        writer.submit(Chat(user_id=1, role="user", content=f"message {i}", model="tinyllama"))
+    writer.stop()
+
+def run(name, production, insert, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, "bench.db"), production)
+        start = time.perf_counter()
+        insert(engine, rows)
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    print(f"{name:<40} {rows / elapsed:>10.0f} inserts/sec")
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    run("default pragmas, commit per row", False, per_row_commits, rows)
+    run("WAL + synchronous=NORMAL, commit per row", True, per_row_commits, rows)
+    run("WAL + write-behind batches", True, write_behind, rows)
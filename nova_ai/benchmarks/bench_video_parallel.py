@@ -0,0 +1,52 @@
+# Wall-clock time of single-pass vs segment-parallel transcoding on a synthetic testsrc clip.
+# Needs ffmpeg/ffprobe on PATH. Run from the nova_ai directory:
+#   python -m benchmarks.bench_video_parallel [seconds] [prompt]
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from backend.config import settings
+from backend.services import video_service, transcode_planner
+
+def make_clip(path, seconds):
+    # 720p test pattern with a tone, keyframe every 2s like typical phone uploads
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size=1280x720:rate=30",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-c:v", "libx264", "-g", "60", "-c:a", "aac", "-shortest", path,
+    ], check=True)
+
+async def timed(input_path, output_path, plan, segments):
+    settings.VIDEO_PARALLEL_SEGMENTS = segments
+    settings.VIDEO_PARALLEL_MIN_SECONDS = 0
+    start = time.perf_counter()
+    returncode, stderr = await video_service.transcode(input_path, output_path, plan, os.cpu_count() or 1)
+    if returncode != 0:
+        raise RuntimeError(stderr)
+    return time.perf_counter() - start
+
+async def main(seconds, prompt):
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = os.path.join(tmp, "input.mp4")
+        make_clip(clip, seconds)
+        graph = video_service.parse_prompt(prompt)
+        plan = transcode_planner.plan(await transcode_planner.probe(clip), graph)
+        # transcode() never uses more segments than cores, so rows past the core count repeat single pass
+        print(f"{seconds}s 720p clip on {os.cpu_count()} cores, filters: {graph.video}")
+
+        single = await timed(clip, os.path.join(tmp, "single.mp4"), plan, 1)
+        print(f"single pass   {single:>7.2f} s")
+        for segments in (2, 4, 8):
+            parallel = await timed(clip, os.path.join(tmp, f"parallel{segments}.mp4"), plan, segments)
+            out_duration = (await transcode_planner.probe(os.path.join(tmp, f"parallel{segments}.mp4"))).duration
+            print(f"{segments} segments    {parallel:>7.2f} s  ({single / parallel:.2f}x, output {out_duration:.2f}s)")
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 120,
+        sys.argv[2] if len(sys.argv) > 2 else "vintage slow motion sharpen",
+    ))
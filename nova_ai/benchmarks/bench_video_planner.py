@@ -0,0 +1,42 @@
+# Wall-clock time of the old always-re-encode command vs the planned command for a few prompts.
+# Needs ffmpeg/ffprobe on PATH. Run from the nova_ai directory:
+#   python -m benchmarks.bench_video_planner [seconds]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from backend.config import settings
+from backend.services import video_service, transcode_planner
+from benchmarks.bench_video_parallel import make_clip
+
+PROMPTS = ["trim nothing, just convert", "make it slow motion", "black and white"]
+
+def full_reencode(graph):
+    # What every request used to run: libx264 + AAC regardless of the filters
+    return transcode_planner.TranscodePlan(None, graph.video, None, False, False, transcode_planner.EncoderProfile(), None)
+
+async def timed(clip, output_path, plan):
+    start = time.perf_counter()
+    returncode, stderr = await video_service.run_ffmpeg(video_service.build_command(clip, output_path, plan))
+    if returncode != 0:
+        raise RuntimeError(stderr)
+    return time.perf_counter() - start
+
+async def main(seconds):
+    settings.VIDEO_PARALLEL_SEGMENTS = 1
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = os.path.join(tmp, "input.mp4")
+        make_clip(clip, seconds)
+        media = await transcode_planner.probe(clip)
+        for prompt in PROMPTS:
+            graph = video_service.parse_prompt(prompt)
+            plan = transcode_planner.plan(media, graph)
+            before = await timed(clip, os.path.join(tmp, "before.mp4"), full_reencode(graph))
+            after = await timed(clip, os.path.join(tmp, "after.mp4"), plan)
+            mode = f"video {'copy' if plan.copy_video else 'x264 ' + plan.profile.preset}, audio {'copy' if plan.copy_audio else 'aac'}"
+            print(f"{prompt!r:<32} {before:>7.2f} s -> {after:>7.2f} s  ({mode})")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 60))
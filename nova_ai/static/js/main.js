@@ -235,7 +235,7 @@ async function sendMessage() {
     input.value = '';
 
     try {
-        const response = await fetch(`${API_URL}/chat/`, {
+        const response = await fetch(`${API_URL}/chat/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -244,17 +244,52 @@ async function sendMessage() {
             body: JSON.stringify({ message, model })
         });
 
-        if (response.ok) {
-            const result = await response.json();
-            addMessageToChat('assistant', result.response);
-        } else {
+        if (!response.ok || !response.body) {
             showToast('Failed to send message');
+            return;
+        }
+
+        // Render tokens as they arrive instead of waiting for the full reply
+        const div = addMessageToChat('assistant', '');
+        const chatWindow = document.getElementById('chat-window');
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseSseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+
+                if (event.type === 'token') {
+                    div.textContent += event.data;
+                    chatWindow.scrollTop = chatWindow.scrollHeight;
+                } else if (event.type === 'error') {
+                    showToast(event.data || 'Failed to send message');
+                }
+            }
         }
     } catch (error) {
         showToast('An error occurred');
     }
 }
 
+function parseSseEvent(raw) {
+    let type = 'message';
+    const dataLines = [];
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) type = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+    });
+    return { type, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+}
+
 function addMessageToChat(role, text) {
     const window = document.getElementById('chat-window');
     const div = document.createElement('div');
@@ -262,15 +297,20 @@ function addMessageToChat(role, text) {
     div.textContent = text;
     window.appendChild(div);
     window.scrollTop = window.scrollHeight;
+    return div;
 }
 
 // Image
+let currentImageJob = null;
+
 async function generateImage() {
     const prompt = document.getElementById('image-prompt').value;
     if (!prompt) return;
 
     const loader = document.getElementById('image-loader');
+    const status = document.getElementById('image-status');
     loader.classList.remove('hidden');
+    status.textContent = 'Queued...';
 
     try {
         const response = await fetch(`${API_URL}/image/generate`, {
@@ -282,83 +322,295 @@ async function generateImage() {
             body: JSON.stringify({ prompt })
         });
 
-        if (response.ok) {
+        if (!response.ok) {
             const result = await response.json();
-            const resultArea = document.getElementById('image-result');
-            resultArea.innerHTML = `<img src="${result.image_url}" alt="${result.prompt}">`;
-            loadHistory('image');
+            showToast(result.detail || 'Image generation failed');
+            loader.classList.add('hidden');
+            return;
+        }
+
+        const result = await response.json();
+        // Cached images come back straight away, without a job
+        if (result.status === 'completed') {
+            loader.classList.add('hidden');
+            showImageResult(result.image_url, prompt);
+            return;
+        }
+        currentImageJob = result.job_id;
+        pollImageJob(result.job_id);
+    } catch (error) {
+        showToast('An error occurred');
+        loader.classList.add('hidden');
+    }
+}
+
+function showImageResult(imageUrl, prompt) {
+    const resultArea = document.getElementById('image-result');
+    resultArea.innerHTML = `<img src="${imageUrl}" alt="${prompt}">`;
+    loadHistory('image');
+}
+
+async function pollImageJob(jobId) {
+    const loader = document.getElementById('image-loader');
+    const status = document.getElementById('image-status');
+
+    try {
+        const response = await fetch(`${API_URL}/image/jobs/${jobId}`, {
+            headers: {
+                'Authorization': `Bearer ${getToken()}`
+            }
+        });
+        if (!response.ok) throw new Error('Job lookup failed');
+        const job = await response.json();
+
+        if (job.status === 'queued') {
+            status.textContent = 'Queued...';
+        } else if (job.status === 'running') {
+            status.textContent = `Generating... ${Math.round(job.progress * 100)}%`;
         } else {
-            showToast('Image generation failed');
+            loader.classList.add('hidden');
+            currentImageJob = null;
+            if (job.status === 'completed') {
+                showImageResult(job.image_url, job.prompt);
+            } else if (job.status === 'failed') {
+                showToast(job.error || 'Image generation failed');
+            }
+            return;
         }
+        setTimeout(() => pollImageJob(jobId), 1000);
     } catch (error) {
         showToast('An error occurred');
-    } finally {
         loader.classList.add('hidden');
     }
 }
 
+async function cancelImage() {
+    if (!currentImageJob) return;
+    await fetch(`${API_URL}/image/jobs/${currentImageJob}`, {
+        method: 'DELETE',
+        headers: {
+            'Authorization': `Bearer ${getToken()}`
+        }
+    });
+    showToast('Image generation cancelled');
+}
+
 // Video
-async function processVideo() {
+let currentVideoJob = null;
+
+function formatEta(seconds) {
+    if (seconds === null || seconds === undefined) return '';
+    const s = Math.round(seconds);
+    return s >= 60 ? ` (~${Math.floor(s / 60)}m ${s % 60}s left)` : ` (~${s}s left)`;
+}
+
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+
+async function uploadVideo(file, onProgress) {
+    // Resumable upload: the server keeps what it received, so a failed chunk
+    // is retried from the offset it reports rather than from the start
+    const headers = { 'Authorization': `Bearer ${getToken()}` };
+    let response = await fetch(`${API_URL}/video/uploads`, {
+        method: 'POST',
+        headers: { ...headers, 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    let session = await response.json();
+    if (!response.ok) throw new Error(session.detail || 'Upload failed');
+
+    let retries = 0;
+    while (!session.complete) {
+        const chunk = file.slice(session.offset, session.offset + UPLOAD_CHUNK_SIZE);
+        try {
+            response = await fetch(`${API_URL}/video/uploads/${session.upload_id}?offset=${session.offset}`, {
+                method: 'PUT',
+                headers: { ...headers, 'Content-Type': 'application/octet-stream' },
+                body: chunk
+            });
+            if (response.status === 413 || response.status === 404) {
+                const error = new Error(response.status === 413 ? 'File is too large' : 'Upload session expired, please upload again');
+                error.fatal = true;
+                throw error;
+            }
+            if (!response.ok && response.status !== 409) throw new Error('Chunk failed');
+            if (response.ok) {
+                session = await response.json();
+                retries = 0;
+                onProgress(session.offset / session.size);
+                continue;
+            }
+        } catch (error) {
+            if (error.fatal || ++retries > 5) throw error;
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+        }
+        response = await fetch(`${API_URL}/video/uploads/${session.upload_id}`, { headers });
+        if (!response.ok) throw new Error('Upload session expired, please upload again');
+        session = await response.json();
+    }
+    return session.upload;
+}
+
+// Previews and the final render share one upload of the selected file
+let lastUpload = { file: null, name: null };
+
+async function processVideo(preview = false) {
     const fileInput = document.getElementById('video-file');
     const prompt = document.getElementById('video-prompt').value;
+    const file = fileInput.files[0];
 
-    if (!fileInput.files[0] || !prompt) return;
+    if (!file || !prompt) return;
 
     const loader = document.getElementById('video-loader');
+    const status = document.getElementById('video-status');
     loader.classList.remove('hidden');
 
-    const formData = new FormData();
-    formData.append('file', fileInput.files[0]);
-    formData.append('prompt', prompt);
-
     try {
-        const response = await fetch(`${API_URL}/video/process`, {
-            method: 'POST',
-            headers: {
-                'Authorization': `Bearer ${getToken()}`
-            },
-            body: formData
-        });
+        let response;
+        // A second pass re-uploads if the server no longer has the earlier upload
+        for (let attempt = 0; attempt < 2; attempt++) {
+            if (lastUpload.file !== file) {
+                status.textContent = 'Uploading...';
+                const name = await uploadVideo(file, progress => {
+                    status.textContent = `Uploading... ${Math.round(progress * 100)}%`;
+                });
+                lastUpload = { file, name };
+            }
+            status.textContent = preview ? 'Rendering preview...' : 'Queued...';
 
-        if (response.ok) {
+            const formData = new FormData();
+            formData.append('upload', lastUpload.name);
+            formData.append('prompt', prompt);
+            if (preview) formData.append('preview', 'true');
+
+            response = await fetch(`${API_URL}/video/process`, {
+                method: 'POST',
+                headers: {
+                    'Authorization': `Bearer ${getToken()}`
+                },
+                body: formData
+            });
+            if (response.status !== 404) break;
+            lastUpload = { file: null, name: null };
+        }
+
+        if (!response.ok) {
             const result = await response.json();
+            showToast(result.detail || 'Video processing failed');
+            loader.classList.add('hidden');
+            return;
+        }
+
+        const result = await response.json();
+        if (preview) {
+            const resultArea = document.getElementById('video-result');
+            resultArea.innerHTML = `<video controls autoplay muted loop src="${result.preview_url}"></video><p>Preview - press Process for the full render</p>`;
+            loader.classList.add('hidden');
+            return;
+        }
+        if (result.cached) {
+            // Same clip and effect were rendered before; no job to wait for
             const resultArea = document.getElementById('video-result');
             resultArea.innerHTML = `<video controls src="${result.output_url}"></video>`;
+            loader.classList.add('hidden');
             loadHistory('video');
+            return;
+        }
+        currentVideoJob = result.job_id;
+        pollVideoJob(result.job_id);
+    } catch (error) {
+        showToast(error.message || 'An error occurred');
+        loader.classList.add('hidden');
+    }
+}
+
+async function pollVideoJob(jobId) {
+    const loader = document.getElementById('video-loader');
+    const status = document.getElementById('video-status');
+
+    try {
+        const response = await fetch(`${API_URL}/video/jobs/${jobId}`, {
+            headers: {
+                'Authorization': `Bearer ${getToken()}`
+            }
+        });
+        if (!response.ok) throw new Error('Job lookup failed');
+        const job = await response.json();
+
+        if (job.status === 'queued') {
+            status.textContent = 'Queued...';
+        } else if (job.status === 'processing') {
+            status.textContent = `Processing... ${Math.round(job.progress * 100)}%${formatEta(job.eta_seconds)}`;
         } else {
-            showToast('Video processing failed');
+            loader.classList.add('hidden');
+            currentVideoJob = null;
+            if (job.status === 'completed') {
+                const resultArea = document.getElementById('video-result');
+                resultArea.innerHTML = `<video controls src="${job.output_url}"></video>`;
+            } else if (job.status === 'failed') {
+                showToast(job.error || 'Video processing failed');
+            }
+            loadHistory('video');
+            return;
         }
+        setTimeout(() => pollVideoJob(jobId), 1000);
     } catch (error) {
         showToast('An error occurred');
-    } finally {
         loader.classList.add('hidden');
     }
 }
 
-async function loadHistory(type) {
+async function cancelVideo() {
+    if (!currentVideoJob) return;
+    await fetch(`${API_URL}/video/jobs/${currentVideoJob}`, {
+        method: 'DELETE',
+        headers: {
+            'Authorization': `Bearer ${getToken()}`
+        }
+    });
+    showToast('Video processing cancelled');
+}
+
+async function loadHistory(type, before = null) {
     const container = document.getElementById(`${type}-history`);
     if (!container) return;
 
+    const params = new URLSearchParams({ limit: 24 });
+    if (before) params.set('before', before);
+
     try {
-        const response = await fetch(`${API_URL}/${type}/history`, {
+        const response = await fetch(`${API_URL}/${type}/history?${params}`, {
             headers: {
                 'Authorization': `Bearer ${getToken()}`
             }
         });
 
         if (response.ok) {
-            const items = await response.json();
-            container.innerHTML = '';
-            items.forEach(item => {
+            const page = await response.json();
+            // A fresh load replaces the list, "Load more" appends the next page
+            if (!before) container.innerHTML = '';
+            const oldButton = container.querySelector('.load-more');
+            if (oldButton) oldButton.remove();
+
+            page.items.forEach(item => {
                 const div = document.createElement('div');
                 div.className = 'history-item';
                 if (type === 'image') {
-                    div.innerHTML = `<img src="${item.image_path}" alt="${item.prompt}"><p>${item.prompt}</p>`;
+                    div.innerHTML = `<a href="${item.image_path}" target="_blank"><img src="${item.thumbnail_url}" alt="${item.prompt}" loading="lazy"></a><p>${item.prompt}</p>`;
+                } else if (item.output_file) {
+                    div.innerHTML = `<video controls preload="none" src="${item.output_file}"></video><p>${item.command}</p>`;
                 } else {
-                    div.innerHTML = `<video controls src="${item.output_file}"></video><p>${item.command}</p>`;
+                    div.innerHTML = `<p>${item.command} (${item.status})</p>`;
                 }
                 container.appendChild(div);
             });
+
+            if (page.next_before) {
+                const button = document.createElement('button');
+                button.className = 'btn load-more';
+                button.textContent = 'Load more';
+                button.onclick = () => loadHistory(type, page.next_before);
+                container.appendChild(button);
+            }
         }
     } catch (error) {
         console.error('Failed to load history', error);
@@ -0,0 +1,162 @@
+import asyncio
+import pytest
+from backend.admission import AdmissionRejected, WorkloadClass
+from backend.config import settings
+from backend.services.job_queue import Job, JobQueue
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def settle():
+    # Lets queued acquire() calls reach their wait
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def admit_in_order(workload, holder, waiters):
+    # waiters: [(user_id, weight)], queued in this order behind holder; returns the users
+    # in the order they were admitted, each releasing as soon as it gets in
+    admitted = []
+
+    async def wait(user_id, weight):
+        ticket = await workload.acquire(user_id, weight)
+        admitted.append(user_id)
+        ticket.release()
+
+    tasks = []
+    for user_id, weight in waiters:
+        tasks.append(asyncio.create_task(wait(user_id, weight)))
+        await settle()
+    holder.release()
+    await asyncio.gather(*tasks)
+    return admitted
+
+def test_equal_weights_alternate_between_users():
+    async def scenario():
+        workload = WorkloadClass("test", capacity=1, max_queue=10, max_per_user=10)
+        holder = await workload.acquire(0)
+        return await admit_in_order(workload, holder, [(1, 1.0)] * 3 + [(2, 1.0)])
+
+    # User 2 arrived last but does not wait behind all of user 1's requests
+    assert run(scenario()) == [1, 2, 1, 1]
+
+def test_heavier_weight_gets_more_turns():
+    async def scenario():
+        workload = WorkloadClass("test", capacity=1, max_queue=10, max_per_user=10)
+        holder = await workload.acquire(0)
+        return await admit_in_order(workload, holder, [(1, 1.0)] * 3 + [(2, 2.0)] * 3)
+
+    assert run(scenario()) == [2, 1, 2, 2, 1, 1]
+
+def test_full_queue_is_rejected():
+    async def scenario():
+        workload = WorkloadClass("test", capacity=1, max_queue=1, max_per_user=10)
+        holder = await workload.acquire(1)
+        queued = asyncio.create_task(workload.acquire(2))
+        await settle()
+        with pytest.raises(AdmissionRejected, match="queue is full") as rejected:
+            await workload.acquire(3)
+        assert rejected.value.retry_after >= 1
+        holder.release()
+        (await queued).release()
+        return workload.stats()
+
+    stats = run(scenario())
+    assert stats["rejected"] == 1 and stats["active"] == 0 and stats["queued"] == 0
+
+def test_per_user_limit_is_rejected():
+    async def scenario():
+        workload = WorkloadClass("test", capacity=5, max_queue=5, max_per_user=2)
+        tickets = [await workload.acquire(1), await workload.acquire(1)]
+        with pytest.raises(AdmissionRejected, match="per-user limit"):
+            await workload.acquire(1)
+        # Other users are unaffected, and a released slot counts again
+        other = await workload.acquire(2)
+        tickets[0].release()
+        tickets.append(await workload.acquire(1))
+        for ticket in tickets[1:] + [other]:
+            ticket.release()
+        return workload
+
+    workload = run(scenario())
+    assert workload.active == 0 and not workload._per_user
+
+def test_queue_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT", 0.1)
+
+    async def scenario():
+        workload = WorkloadClass("test", capacity=1, max_queue=5, max_per_user=5)
+        holder = await workload.acquire(1)
+        with pytest.raises(AdmissionRejected, match="queue timeout"):
+            await workload.acquire(2)
+        assert workload._queued == 0 and 2 not in workload._per_user
+        holder.release()
+        return workload
+
+    assert run(scenario()).active == 0
+
+def test_cancel_while_queued():
+    async def scenario():
+        workload = WorkloadClass("test", capacity=1, max_queue=5, max_per_user=5)
+        holder = await workload.acquire(1)
+        queued = asyncio.create_task(workload.acquire(2))
+        await settle()
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert workload._queued == 0 and 2 not in workload._per_user
+        holder.release()
+        return workload
+
+    workload = run(scenario())
+    assert workload.active == 0 and not workload._waiters
+
+def test_cancel_just_after_being_admitted():
+    async def scenario():
+        workload = WorkloadClass("test", capacity=1, max_queue=5, max_per_user=5)
+        holder = await workload.acquire(1)
+        queued = asyncio.create_task(workload.acquire(2))
+        await settle()
+        # The slot passes to the waiter, which is cancelled before it gets to run
+        holder.release()
+        assert workload.active == 1
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        return workload
+
+    workload = run(scenario())
+    assert workload.active == 0 and not workload._per_user
+
+class BlockingQueue(JobQueue):
+    def __init__(self):
+        super().__init__(workers=1, queue_max=5, job_ttl=60)
+        self.unblock = asyncio.Event()
+
+    async def execute(self, job):
+        await self.unblock.wait()
+        job.status = "completed"
+
+def test_cancelling_a_queued_job_releases_its_ticket():
+    async def scenario():
+        workload = WorkloadClass("test", capacity=2, max_queue=5, max_per_user=5)
+        queue = BlockingQueue()
+        jobs = []
+        for user_id in (1, 2):
+            ticket = await workload.acquire(user_id)
+            job = queue.enqueue(Job(None))
+            job.admission = ticket
+            ticket.hand_off()
+            jobs.append(job)
+            await settle()
+        running, queued = jobs
+        assert (running.status, queued.status, workload.active) == ("running", "queued", 2)
+
+        queue.cancel(queued)
+        assert queued.status == "cancelled" and workload.active == 1
+        queue.unblock.set()
+        await settle()
+        assert running.status == "completed" and workload.active == 0
+        await queue.stop()
+        return workload
+
+    assert not run(scenario())._per_user
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+import pytest
+from backend.services import image_service
+from backend.services.image_service import BatchScheduler, GenerationCancelled
+
+class StubPipeline:
+    # Records each batched call, runs the step callback like diffusers and returns one "image" per prompt
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompts, num_inference_steps, height, width, guidance_scale, generator, callback_on_step_end):
+        self.calls.append((list(prompts), (num_inference_steps, height, width, guidance_scale)))
+        if any("boom" in prompt for prompt in prompts):
+            raise RuntimeError("pipeline failed")
+        for step in range(num_inference_steps):
+            callback_on_step_end(self, step, step, {})
+        return SimpleNamespace(images=[f"image of {prompt}" for prompt in prompts])
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    pipe = StubPipeline()
+
+    @contextmanager
+    def acquire():
+        yield pipe
+
+    monkeypatch.setattr(image_service, "manager", SimpleNamespace(acquire=acquire, generators=lambda pipe, seeds: seeds))
+    return pipe
+
+def generate_all(scheduler, requests):
+    # requests: (prompt, steps, size, on_step); submitted at once from separate worker threads
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        futures = [
+            pool.submit(scheduler.generate, prompt, 1, steps, size, size, 7.5, on_step)
+            for prompt, steps, size, on_step in requests
+        ]
+        return [f.exception() or f.result() for f in futures]
+
+def test_groups_by_params_and_fans_out_results(pipeline):
+    scheduler = BatchScheduler(max_batch=4, max_wait=0.3)
+    results = generate_all(scheduler, [
+        ("a", 2, 512, None), ("b", 4, 512, None), ("c", 2, 512, None), ("d", 2, 768, None),
+    ])
+    assert results == ["image of a", "image of b", "image of c", "image of d"]
+    batches = sorted((sorted(prompts), params) for prompts, params in pipeline.calls)
+    assert batches == [
+        (["a", "c"], (2, 512, 512, 7.5)),
+        (["b"], (4, 512, 512, 7.5)),
+        (["d"], (2, 768, 768, 7.5)),
+    ]
+
+def test_batches_never_exceed_the_limit(pipeline):
+    scheduler = BatchScheduler(max_batch=2, max_wait=0.3)
+    results = generate_all(scheduler, [(f"p{i}", 1, 512, None) for i in range(5)])
+    assert results == [f"image of p{i}" for i in range(5)]
+    assert sorted(len(prompts) for prompts, _ in pipeline.calls) == [1, 2, 2]
+
+def test_pipeline_error_reaches_every_caller_in_the_batch(pipeline):
+    scheduler = BatchScheduler(max_batch=4, max_wait=0.3)
+    results = generate_all(scheduler, [("fine", 1, 512, None), ("boom", 1, 512, None), ("also fine", 1, 512, None)])
+    assert len(pipeline.calls) == 1
+    assert all(isinstance(r, RuntimeError) and str(r) == "pipeline failed" for r in results)
+
+def test_cancelled_item_does_not_stop_the_rest(pipeline):
+    steps_seen = []
+
+    def cancel(step, total):
+        raise GenerationCancelled()
+
+    def record(step, total):
+        steps_seen.append((step, total))
+
+    scheduler = BatchScheduler(max_batch=4, max_wait=0.3)
+    results = generate_all(scheduler, [("keep", 3, 512, record), ("drop", 3, 512, cancel)])
+    assert results[0] == "image of keep"
+    assert isinstance(results[1], GenerationCancelled)
+    assert steps_seen == [(1, 3), (2, 3), (3, 3)]
@@ -0,0 +1,18 @@
+import asyncio
+from backend.services import chat_context
+
+def test_summary_lock_serializes_and_is_dropped():
+    order = []
+
+    async def update(name):
+        async with chat_context._summary_lock(1):
+            order.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name} end")
+
+    async def run():
+        await asyncio.gather(update("a"), update("b"), update("c"))
+
+    asyncio.run(run())
+    assert order == ["a start", "a end", "b start", "b end", "c start", "c end"]
+    assert chat_context._summary_locks == {}
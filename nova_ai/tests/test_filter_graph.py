@@ -0,0 +1,60 @@
+import pytest
+from backend.services.filter_graph import Filter, atempo_chain, compile_prompt, eq, fuse_eq
+
+SCALE = Filter("scale", (("w", "1280"), ("h", "-2")))
+
+@pytest.mark.parametrize("prompt, video, audio", [
+    ("cinematic increase brightness", "crop=w=iw:h=ih-140,eq=brightness=0.36:contrast=1.2:saturation=1.2", None),
+    ("slow motion fast motion", "setpts=expr=0.5*PTS", "atempo=2"),
+    ("black and white grayscale blur", "hue=s=0,boxblur=luma_radius=10:luma_power=1", None),
+    ("vintage cinematic sharpen",
+     "crop=w=iw:h=ih-140,curves=preset=vintage,eq=contrast=1.2:saturation=1.2,unsharp=lx=5:ly=5:la=1.0:cx=5:cy=5:ca=0.0", None),
+    ("increase brightness decrease brightness", None, None),
+    ("fast motion, actually slow motion", "setpts=expr=2*PTS", "atempo=0.5"),
+    ("no known effect", None, None),
+])
+def test_compiled_graphs(prompt, video, audio):
+    graph = compile_prompt(prompt)
+    assert (graph.video, graph.audio) == (video, audio)
+
+def test_eq_fusion_composes_brightness_and_contrast():
+    fused = fuse_eq(eq(brightness=0.3), eq(contrast=1.2, saturation=1.2))
+    assert fused.render() == "eq=brightness=0.36:contrast=1.2:saturation=1.2"
+    # Opposite adjustments cancel out into no filter at all
+    assert fuse_eq(eq(brightness=0.3), eq(brightness=-0.3)) is None
+
+def test_single_eq_pass_per_graph():
+    graph = compile_prompt("cinematic increase brightness decrease brightness")
+    assert [f.name for f in graph.filters].count("eq") == 1
+
+def test_geometry_runs_before_color_and_detail():
+    graph = compile_prompt("sharpen vintage cinematic")
+    assert [f.name for f in graph.filters] == ["crop", "curves", "eq", "unsharp"]
+
+def test_scale_goes_after_crop():
+    graph = compile_prompt("cinematic blur")
+    assert graph.video_filter(SCALE) == "crop=w=iw:h=ih-140,scale=w=1280:h=-2,eq=contrast=1.2:saturation=1.2,boxblur=luma_radius=10:luma_power=1"
+    # Without cropping the scale runs first
+    assert compile_prompt("blur").video_filter(SCALE).startswith("scale=")
+    assert compile_prompt("").video_filter(SCALE) == "scale=w=1280:h=-2"
+
+def test_last_mentioned_speed_wins():
+    assert compile_prompt("slow motion then fast motion").speed == 0.5
+    assert compile_prompt("fast motion then slow motion").speed == 2.0
+    # Timing always ends the chain
+    assert compile_prompt("slow motion vintage").video == "curves=preset=vintage,setpts=expr=2*PTS"
+
+def test_graph_key_is_shared_by_equivalent_prompts():
+    assert compile_prompt("black and white").key == compile_prompt("grayscale black and white").key
+    assert compile_prompt("blur").key != compile_prompt("sharpen").key
+
+@pytest.mark.parametrize("tempo, chain", [
+    (1.5, "atempo=1.5"),
+    (2.0, "atempo=2"),
+    (4.0, "atempo=2.0,atempo=2"),
+    (0.5, "atempo=0.5"),
+    (0.25, "atempo=0.5,atempo=0.5"),
+    (8.0, "atempo=2.0,atempo=2.0,atempo=2"),
+])
+def test_atempo_chain_stays_in_range(tempo, chain):
+    assert atempo_chain(tempo) == chain
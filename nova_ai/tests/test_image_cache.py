@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from backend.config import settings
+from backend.database import Base
+from backend.models import User, Image
+from backend.services import image_service, image_store, image_variants, storage
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "STATIC_DIR", str(tmp_path))
+    monkeypatch.setattr(image_store, "GENERATED_DIR", str(tmp_path / "generated"))
+    monkeypatch.setattr(image_variants, "VARIANTS_DIR", str(tmp_path / "generated" / "variants"))
+    monkeypatch.setattr(image_variants, "submit", lambda image_path: None)
+    monkeypatch.setattr(settings, "INFERENCE_SOCKET", "")
+    (tmp_path / "generated").mkdir()
+    return tmp_path
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+@pytest.fixture
+def user(db):
+    user = User(username="alice", email="alice@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+def test_cache_key_is_content_addressed():
+    params = {"steps": 20, "size": 512, "guidance": 7.5}
+    key = image_store.cache_key("a fox", 1, "mock", params)
+    assert key == image_store.cache_key("a fox", 1, "mock", dict(reversed(params.items())))
+    assert len({
+        key,
+        image_store.cache_key("a fox!", 1, "mock", params),
+        image_store.cache_key("a fox", 2, "mock", params),
+        image_store.cache_key("a fox", 1, "sd", params),
+        image_store.cache_key("a fox", 1, "mock", {**params, "steps": 21}),
+    }) == 5
+    assert image_store.default_seed("a fox") == image_store.default_seed("a fox")
+
+def test_identical_requests_generate_once(static_dir, monkeypatch):
+    renders = []
+
+    def slow_mock_image(prompt, filepath):
+        renders.append(prompt)
+        time.sleep(0.2)
+        with open(filepath, "wb") as f:
+            f.write(b"png")
+
+    monkeypatch.setattr(image_service, "create_mock_image", slow_mock_image)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(image_service._produce("same", 1, "mock", {}, None)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert renders == ["same"]
+    assert len({url for url, _ in results}) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True]
+    assert image_store._key_locks == {}
+
+def test_mock_generation_then_cache_hit(static_dir, db, user, monkeypatch):
+    monkeypatch.setattr(image_service, "SD_LIBRARY_PRESENT", False)
+    first = image_service.generate_image(db, user, "a red kite")
+    second = image_service.generate_image(db, user, "a red kite")
+    assert first.image_path == second.image_path
+    assert os.path.exists(storage.static_path(first.image_path))
+    assert json.loads(first.parameters)["cached"] is False
+    assert json.loads(second.parameters)["cached"] is True
+    assert image_store.reference_count(db, first.image_path) == 2
+
+def test_cache_hit_never_loads_the_model(static_dir, db, user, monkeypatch):
+    def load():
+        raise AssertionError("a cache hit loaded the model")
+
+    monkeypatch.setattr(image_service, "SD_LIBRARY_PRESENT", True)
+    monkeypatch.setattr(image_service.manager, "load_failed", False)
+    monkeypatch.setattr(image_service.manager, "load", load)
+    assert image_service.generate_cached(db, user, "a blue kite") is None
+
+    seed = image_store.default_seed("a blue kite")
+    key = image_store.cache_key("a blue kite", seed, settings.DIFFUSION_MODEL_ID, image_service._params())
+    filepath, url = image_store.path_for(key)
+    with open(filepath, "wb") as f:
+        f.write(b"png")
+
+    assert image_service.render_local("a blue kite", seed) == (url, True, settings.DIFFUSION_MODEL_ID, image_service._params())
+    image = image_service.generate_cached(db, user, "a blue kite")
+    assert image.image_path == url
+    assert json.loads(image.parameters)["cached"] is True
+
+def test_eviction_is_lru_and_keeps_referenced_files(static_dir, db, user, monkeypatch):
+    generated = static_dir / "generated"
+    variants = generated / "variants"
+    variants.mkdir()
+    now = time.time()
+    # Oldest first; all older than the grace window for uncommitted rows
+    for age, name in [(400, "referenced"), (300, "oldest"), (200, "middle"), (100, "newest")]:
+        path = generated / f"{name}.png"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (now - age, now - age))
+    (variants / f"oldest.{image_variants.EXTENSION}").write_bytes(b"v")
+    db.add(Image(user_id=user.id, prompt="kept", image_path="/static/generated/referenced.png"))
+    db.commit()
+
+    monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_BYTES", 250)
+    assert image_store.enforce_quota(db) == 201  # two originals plus the 1-byte variant
+    assert sorted(p.name for p in generated.glob("*.png")) == ["newest.png", "referenced.png"]
+    assert list(variants.iterdir()) == []
+
+def test_variants_count_towards_the_quota(static_dir, db, monkeypatch):
+    generated = static_dir / "generated"
+    variants = generated / "variants"
+    variants.mkdir()
+    now = time.time()
+    for age, name in [(200, "old"), (100, "new")]:
+        path = generated / f"{name}.png"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (now - age, now - age))
+        (variants / f"{name}.{image_variants.EXTENSION}").write_bytes(b"v" * 50)
+        (variants / f"{name}_thumb.{image_variants.EXTENSION}").write_bytes(b"t" * 10)
+
+    # The originals alone (200 bytes) fit; with their variants (320 bytes) they don't
+    monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_BYTES", 250)
+    assert image_store.enforce_quota(db) == 160
+    assert [p.name for p in generated.glob("*.png")] == ["new.png"]
+    assert sorted(p.name for p in variants.iterdir()) == [f"new.{image_variants.EXTENSION}", f"new_thumb.{image_variants.EXTENSION}"]
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+import pytest
+from backend import inference_server
+from backend.config import settings
+from backend.services import image_service, image_store, inference_client
+from backend.services.image_service import GenerationCancelled
+
+@pytest.fixture
+def generated_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "generated"
+    directory.mkdir()
+    monkeypatch.setattr(image_store, "GENERATED_DIR", str(directory))
+    return directory
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    # Runs inference_server.serve on its own event loop thread, like the standalone process
+    path = str(tmp_path / "inference.sock")
+    monkeypatch.setattr(settings, "INFERENCE_SOCKET", path)
+
+    async def run():
+        try:
+            await inference_server.serve(path)
+        except asyncio.CancelledError:
+            # Also stop connections still being handled
+            others = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for other in others:
+                other.cancel()
+            await asyncio.gather(*others, return_exceptions=True)
+
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(run())
+    thread = threading.Thread(target=loop.run_until_complete, args=(task,), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not (tmp_path / "inference.sock").exists():
+        assert time.monotonic() < deadline, "inference server did not start"
+        time.sleep(0.01)
+    yield path
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(timeout=5)
+    loop.close()
+
+@pytest.fixture
+def stepping_renderer(monkeypatch):
+    # Stands in for the diffusers pipeline: reports a step every 20 ms and records how it ended
+    runs = []
+
+    def render_local(prompt, seed, on_step=None):
+        run = {"steps": 0, "cancelled": False}
+        runs.append(run)
+        try:
+            for step in range(1, 51):
+                time.sleep(0.02)
+                on_step(step, 50)
+                run["steps"] = step
+        except GenerationCancelled:
+            run["cancelled"] = True
+            raise
+        return "/static/generated/stepped.png", False, "mock", {"steps": 50}
+
+    monkeypatch.setattr(image_service, "render_local", render_local)
+    return runs
+
+def test_generation_and_cache_hit(socket_path, generated_dir):
+    url, cache_hit, model, params = inference_client.render("a lighthouse", 7)
+    assert model == "mock" and not cache_hit
+    assert (generated_dir / url.rsplit("/", 1)[1]).exists()
+
+    again = inference_client.render("a lighthouse", 7)
+    assert again[0] == url and again[1] is True
+
+def test_step_events_reach_the_client(socket_path, stepping_renderer):
+    steps = []
+    url, _, _, _ = inference_client.render("steps", 1, on_step=lambda step, total: steps.append((step, total)))
+    assert url == "/static/generated/stepped.png"
+    assert steps == [(step, 50) for step in range(1, 51)]
+
+def test_disconnect_cancels_on_the_server(socket_path, stepping_renderer):
+    def on_step(step, total):
+        if step == 3:
+            raise GenerationCancelled()
+
+    with pytest.raises(GenerationCancelled):
+        inference_client.render("cancel me", 1, on_step=on_step)
+    deadline = time.monotonic() + 5
+    while not (stepping_renderer and stepping_renderer[0]["cancelled"]):
+        assert time.monotonic() < deadline, "server kept generating after the client left"
+        time.sleep(0.02)
+    assert stepping_renderer[0]["steps"] < 50
+
+def test_cancel_before_the_first_step(socket_path, monkeypatch):
+    def slow_render_local(prompt, seed, on_step=None):
+        time.sleep(2)
+        return "/static/generated/slow.png", False, "mock", {}
+
+    monkeypatch.setattr(image_service, "render_local", slow_render_local)
+    cancel_event = threading.Event()
+    threading.Timer(0.2, cancel_event.set).start()
+    started = time.monotonic()
+    with pytest.raises(GenerationCancelled):
+        inference_client.render("never steps", 1, cancel_event=cancel_event)
+    assert time.monotonic() - started < 1.0
+
+def test_mock_fallback_when_the_socket_is_gone(tmp_path, generated_dir, monkeypatch):
+    monkeypatch.setattr(settings, "INFERENCE_SOCKET", str(tmp_path / "missing.sock"))
+    url, cache_hit, model, _ = image_service.render("offline", 3)
+    assert model == "mock" and not cache_hit
+    assert (generated_dir / url.rsplit("/", 1)[1]).exists()
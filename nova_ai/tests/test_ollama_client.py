@@ -0,0 +1,118 @@
+import asyncio
+import time
+from aiohttp import web
+from backend.config import settings
+from backend.services.ollama_backends import BackendPool
+from backend.services.ollama_client import OllamaClient
+
+MODEL = "tinyllama"
+
+async def start_backend(name: str, status: int = 200, delay: float = 0.0):
+    # Stand-in Ollama: answers /chat after `delay`, reports MODEL as pulled and loaded
+    calls = []
+
+    async def chat(request):
+        calls.append(await request.json())
+        await asyncio.sleep(delay)
+        return web.json_response({"message": {"content": name}}, status=status)
+
+    async def models(request):
+        return web.json_response({"models": [{"name": f"{MODEL}:latest"}]})
+
+    app = web.Application()
+    app.router.add_post("/api/chat", chat)
+    app.router.add_get("/api/tags", models)
+    app.router.add_get("/api/ps", models)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}/api", calls, runner
+
+def make_client(urls: list[str]) -> OllamaClient:
+    client = OllamaClient()
+    client.pool = BackendPool(urls)
+    return client
+
+async def chat(client: OllamaClient) -> str:
+    async with client.post("/chat", {"model": MODEL, "messages": []}) as response:
+        return (await response.json())["message"]["content"]
+
+def test_pick_prefers_least_loaded_healthy_backend():
+    pool = BackendPool(["http://a/api", "http://b/api", "http://c/api"])
+    a, b, c = pool.backends
+    a.in_flight, b.in_flight, c.in_flight = 3, 1, 0
+    c.healthy = False
+    assert pool.pick(MODEL) is b
+    # A backend that already has the model loaded wins over a less busy one
+    a.loaded_models = {MODEL}
+    assert pool.pick(MODEL) is a
+    assert pool.pick(MODEL, exclude={a.url, b.url}) is c
+
+def test_requests_spread_across_backends(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_MAX_CONCURRENCY", 1)
+
+    async def run():
+        url_a, calls_a, runner_a = await start_backend("a", delay=0.2)
+        url_b, calls_b, runner_b = await start_backend("b", delay=0.2)
+        client = make_client([url_a, url_b])
+        try:
+            assert client.limit_for(MODEL) == 2
+            started = time.monotonic()
+            answers = await asyncio.gather(chat(client), chat(client))
+            elapsed = time.monotonic() - started
+        finally:
+            await client.close()
+            await runner_a.cleanup()
+            await runner_b.cleanup()
+        assert sorted(answers) == ["a", "b"]
+        assert len(calls_a) == len(calls_b) == 1
+        # One slot per backend: both requests ran at the same time
+        assert elapsed < 0.35
+
+    asyncio.run(run())
+
+def test_limit_follows_healthy_backends(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_MAX_CONCURRENCY", 2)
+    client = make_client(["http://a/api", "http://b/api"])
+    assert client.limit_for(MODEL) == 4
+    client.pool.mark_failed(client.pool.backends[0], "down")
+    assert client.limit_for(MODEL) == 2
+    client.pool.mark_failed(client.pool.backends[1], "down")
+    assert client.limit_for(MODEL) == 2
+
+def test_failover_on_server_error():
+    async def run():
+        url_bad, calls_bad, runner_bad = await start_backend("bad", status=500)
+        url_good, calls_good, runner_good = await start_backend("good")
+        client = make_client([url_bad, url_good])
+        client.pool.backends[1].in_flight = 5  # make the failing backend the first pick
+        try:
+            assert await chat(client) == "good"
+        finally:
+            await client.close()
+            await runner_bad.cleanup()
+            await runner_good.cleanup()
+        assert len(calls_bad) == 1 and len(calls_good) == 1
+        # The health check may already have revived it, since /tags still answers
+        assert client.pool.backends[0].failures >= 1
+
+    asyncio.run(run())
+
+def test_failover_when_backend_is_down():
+    async def run():
+        url_down, _, runner_down = await start_backend("down")
+        await runner_down.cleanup()  # nothing listens on this port any more
+        url_good, calls_good, runner_good = await start_backend("good")
+        client = make_client([url_down, url_good])
+        client.pool.backends[1].in_flight = 5
+        try:
+            assert await chat(client) == "good"
+        finally:
+            await client.close()
+            await runner_good.cleanup()
+        assert client.pool.backends[0].failures >= 1
+        assert client.pool.backends[0].in_flight == 0
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+import pytest
+from backend.config import settings
+from backend.services.filter_graph import compile_prompt
+from backend.services.transcode_planner import MediaInfo, downscale_filter, plan
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_MAX_WIDTH", 1280)
+    monkeypatch.setattr(settings, "VIDEO_MAX_HEIGHT", 720)
+    monkeypatch.setattr(settings, "VIDEO_SPEED_PROFILE", "balanced")
+
+def media(video_codec="h264", width=1280, height=720, audio_codec="aac", pix_fmt="yuv420p", duration=10.0):
+    return MediaInfo(duration, video_codec, width, height, audio_codec, pix_fmt)
+
+@pytest.mark.parametrize("width, height, expected", [
+    (1280, 720, None),
+    (640, 360, None),
+    (720, 1280, None),  # portrait within the rotated box
+    (1920, 1080, "scale=w=1280:h=720:force_original_aspect_ratio=decrease:force_divisible_by=2"),
+    (1080, 1920, "scale=w=720:h=1280:force_original_aspect_ratio=decrease:force_divisible_by=2"),
+    (1280, 800, "scale=w=1280:h=720:force_original_aspect_ratio=decrease:force_divisible_by=2"),
+])
+def test_downscale_filter(width, height, expected):
+    scale = downscale_filter(media(width=width, height=height))
+    assert (scale.render() if scale else None) == expected
+
+def test_downscale_needs_dimensions():
+    assert downscale_filter(None) is None
+    assert downscale_filter(media(width=None, height=None)) is None
+
+def test_browser_playable_streams_are_copied():
+    result = plan(media(), compile_prompt("no known effect"))
+    assert result.copy_video and result.copy_audio
+    assert result.video_args() == ["-c:v", "copy"] and result.audio_args() == ["-c:a", "copy"]
+    assert result.duration == 10.0
+    assert plan(media(audio_codec="mp3"), compile_prompt("")).copy_audio
+    assert plan(media(audio_codec=None), compile_prompt("")).copy_audio  # no audio track at all
+
+@pytest.mark.parametrize("kwargs", [
+    {"video_codec": "hevc"},
+    {"video_codec": "av1"},
+    {"video_codec": "mpeg4"},
+    {"pix_fmt": "yuv420p10le"},
+    {"pix_fmt": "yuv444p"},
+    {"pix_fmt": None},
+    {"width": 1920, "height": 1080},
+])
+def test_other_video_is_reencoded(kwargs):
+    result = plan(media(**kwargs), compile_prompt(""))
+    assert not result.copy_video
+    args = result.video_args(threads=2)
+    assert args[args.index("-c:v") + 1] == "libx264"
+    assert args[args.index("-pix_fmt") + 1] == "yuv420p"
+    assert args[-2:] == ["-threads", "2"]
+
+def test_oversized_copy_candidate_gets_the_downscale():
+    result = plan(media(width=1920, height=1080), compile_prompt(""))
+    assert result.video_filter.startswith("scale=w=1280:h=720")
+
+@pytest.mark.parametrize("audio_codec", ["ac3", "eac3", "alac", "opus"])
+def test_other_audio_is_reencoded(audio_codec):
+    result = plan(media(audio_codec=audio_codec), compile_prompt(""))
+    assert result.copy_video and not result.copy_audio
+    assert result.audio_args() == ["-c:a", "aac"]
+
+def test_filters_force_a_reencode_and_scale_duration():
+    result = plan(media(width=1920, height=1080), compile_prompt("slow motion"))
+    assert not result.copy_video and not result.copy_audio
+    assert result.video_filter == "scale=w=1280:h=720:force_original_aspect_ratio=decrease:force_divisible_by=2,setpts=expr=2*PTS"
+    assert result.audio_args() == ["-af", "atempo=0.5", "-c:a", "aac"]
+    assert result.duration == 20.0
+
+def test_without_probe_data_everything_is_reencoded():
+    result = plan(None, compile_prompt(""))
+    assert not result.copy_video and not result.copy_audio
+    assert result.duration is None
@@ -0,0 +1,97 @@
+import asyncio
+import sys
+import time
+import pytest
+from backend.config import settings
+from backend.services import video_service
+from backend.services.job_queue import JobQueue
+from backend.services.video_jobs import VideoJob, VideoJobQueue
+
+def fake_ffmpeg(script: str) -> list[str]:
+    # run_ffmpeg only needs a process that talks like ffmpeg -progress pipe:1
+    return [sys.executable, "-c", "import sys, time\n" + script]
+
+def test_progress_lines_are_parsed():
+    script = (
+        "print('frame=1\\nout_time_us=500000\\nout_time_ms=1250000\\nout_time=N/A\\nout_time_us=N/A\\nprogress=end', flush=True)\n"
+        "for i in range(30): print(f'warning {i}', file=sys.stderr)\n"
+    )
+    positions = []
+    returncode, stderr = asyncio.run(video_service.run_ffmpeg(fake_ffmpeg(script), positions.append))
+    assert returncode == 0
+    assert positions == [0.5, 1.25]
+    # Only the tail of stderr is kept
+    assert stderr.splitlines() == [f"warning {i}" for i in range(10, 30)]
+
+def test_eta_from_progress():
+    job = VideoJob(None, 1, "in.mp4", "", "key")
+    assert job.progress == 0.0 and job.eta is None
+
+    job.status = job.RUNNING
+    job.started_at = time.time() - 10
+    assert job.eta is None  # nothing encoded yet
+    job.duration = 100.0
+    job.on_progress(25.0)
+    assert job.progress == 0.25
+    assert job.eta == pytest.approx(30.0, abs=0.5)
+
+    job.on_progress(150.0)
+    assert job.progress == 1.0 and job.eta == 0.0
+    job.status = "completed"
+    assert job.eta is None
+
+def test_cancel_kills_ffmpeg():
+    queue = VideoJobQueue()
+    job = VideoJob(None, 1, "in.mp4", "", "key")
+    script = "print('out_time_us=1000000', flush=True)\ntime.sleep(30)\n"
+
+    def on_progress(position):
+        job.on_progress(position)
+        queue.on_cancel(job)
+
+    async def scenario():
+        started = time.monotonic()
+        returncode, _ = await video_service.run_ffmpeg(fake_ffmpeg(script), on_progress, job.on_start)
+        return returncode, time.monotonic() - started
+
+    returncode, elapsed = asyncio.run(scenario())
+    assert returncode != 0 and elapsed < 5
+    assert job.cancel_event.is_set() and job.position == 1.0
+
+def test_process_started_after_cancel_is_killed():
+    job = VideoJob(None, 1, "in.mp4", "", "key")
+    job.cancel_event.set()
+    returncode, _ = asyncio.run(video_service.run_ffmpeg(fake_ffmpeg("time.sleep(30)\n"), on_start=job.on_start))
+    assert returncode != 0
+
+def test_job_queue_requires_execute():
+    with pytest.raises(TypeError):
+        JobQueue(1, 1, 60)
+
+def test_stop_records_interrupted_jobs(monkeypatch):
+    monkeypatch.setattr(settings, "VIDEO_WORKERS", 1)
+    updates = []
+
+    async def update_log(log_id, **values):
+        updates.append((log_id, values))
+
+    async def scenario():
+        queue = VideoJobQueue()
+        running = asyncio.Event()
+
+        async def run_forever(job):
+            running.set()
+            await asyncio.sleep(3600)
+
+        queue._run = run_forever
+        first = queue.submit(None, 1, "a.mp4", "", "a")
+        second = queue.submit(None, 2, "b.mp4", "", "b")
+        await asyncio.wait_for(running.wait(), 5)
+        await queue.stop()
+        return first, second
+
+    monkeypatch.setattr(video_service, "update_log", update_log)
+    first, second = asyncio.run(scenario())
+    assert (first.status, second.status) == ("failed", "cancelled")
+    assert first.finished_at is not None and second.finished_at is not None
+    assert sorted(updates) == [(1, {"status": "failed"}), (2, {"status": "cancelled"})]
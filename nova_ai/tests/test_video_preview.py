@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+import pytest
+from backend.config import settings
+from backend.services import transcode_planner, video_service
+
+@pytest.fixture
+def preview_dir(tmp_path, monkeypatch):
+    async def probe(path):
+        return None
+
+    monkeypatch.setattr(video_service, "PREVIEW_DIR", str(tmp_path))
+    monkeypatch.setattr(transcode_planner, "probe", probe)
+    monkeypatch.setattr(video_service, "_preview_slots", asyncio.Semaphore(1))
+    return tmp_path
+
+def fake_ffmpeg(monkeypatch, script: str):
+    # Stands in for ffmpeg: writes some output, then behaves as the script says
+    def build_command(input_file_path, output_path, plan, threads=0):
+        return [sys.executable, "-c", f"import sys, time\nopen({output_path!r}, 'wb').write(b'mp4')\n{script}"]
+    monkeypatch.setattr(video_service, "build_command", build_command)
+
+def test_successful_preview_is_kept(preview_dir, monkeypatch):
+    fake_ffmpeg(monkeypatch, "")
+    url = asyncio.run(video_service.render_preview("in.mp4", "vintage"))
+    assert url.endswith(".mp4") and os.listdir(preview_dir) == [url.rsplit("/", 1)[1]]
+
+def test_failed_preview_is_removed(preview_dir, monkeypatch):
+    fake_ffmpeg(monkeypatch, "sys.exit(1)")
+    assert asyncio.run(video_service.render_preview("in.mp4", "vintage")) is None
+    assert os.listdir(preview_dir) == []
+
+def test_timed_out_preview_is_removed(preview_dir, monkeypatch):
+    fake_ffmpeg(monkeypatch, "time.sleep(30)")
+    monkeypatch.setattr(settings, "VIDEO_PREVIEW_TIMEOUT", 0.5)
+    with pytest.raises(TimeoutError):
+        asyncio.run(video_service.render_preview("in.mp4", "vintage"))
+    assert os.listdir(preview_dir) == []
+
+def test_waiting_for_a_slot_counts_towards_the_timeout(preview_dir, monkeypatch):
+    fake_ffmpeg(monkeypatch, "")
+    monkeypatch.setattr(video_service, "_preview_slots", asyncio.Semaphore(0))
+    monkeypatch.setattr(settings, "VIDEO_PREVIEW_TIMEOUT", 0.2)
+    with pytest.raises(TimeoutError):
+        asyncio.run(video_service.render_preview("in.mp4", "vintage"))
+    assert os.listdir(preview_dir) == []
@@ -0,0 +1,26 @@
+from backend.services.video_service import plan_segments
+
+def test_no_keyframes_means_one_segment():
+    assert plan_segments(10.0, [], 4) == [(0.0, None)]
+
+def test_cuts_at_nearest_keyframes_and_last_segment_is_open():
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert plan_segments(10.0, keyframes, 4) == [(0.0, 2.0), (2.0, 4.0), (4.0, 8.0), (8.0, None)]
+    # The last segment runs to the end of the input, past the last keyframe
+    assert plan_segments(9.0, keyframes, 2)[-1] == (4.0, None)
+
+def test_duplicate_nearest_keyframes_are_cut_once():
+    # Split points 2.5, 5 and 7.5 all land nearest the keyframe at 5
+    assert plan_segments(10.0, [0.0, 5.0], 4) == [(0.0, 5.0), (5.0, None)]
+    assert plan_segments(10.0, [4.9], 8) == [(0.0, 4.9), (4.9, None)]
+
+def test_keyframe_at_zero_is_not_a_cut():
+    assert plan_segments(10.0, [0.0], 3) == [(0.0, None)]
+    assert plan_segments(10.0, [0.0, 9.0], 4) == [(0.0, 9.0), (9.0, None)]
+
+def test_cuts_only_move_forward():
+    segments = plan_segments(12.0, [0.0, 1.0, 3.0, 11.0], 6)
+    starts = [start for start, _ in segments]
+    assert starts == sorted(set(starts))
+    assert all(end is None or end > start for start, end in segments)
+    assert segments[-1][1] is None
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import time
+import pytest
+from backend.config import settings
+from backend.services import storage, video_service, video_store
+from backend.services.filter_graph import compile_prompt
+
+@pytest.fixture
+def video_dirs(tmp_path, monkeypatch):
+    output_dir = tmp_path / "videos"
+    for name in ("uploads", "previews"):
+        (output_dir / name).mkdir(parents=True)
+    monkeypatch.setattr(storage, "STATIC_DIR", str(tmp_path))
+    monkeypatch.setattr(video_service, "OUTPUT_DIR", str(output_dir))
+    monkeypatch.setattr(video_service, "UPLOAD_DIR", str(output_dir / "uploads"))
+    monkeypatch.setattr(video_service, "PREVIEW_DIR", str(output_dir / "previews"))
+    return output_dir
+
+def write(path, size=100, age=0.0):
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+def test_cache_key_is_stable(tmp_path, monkeypatch):
+    data = b"same bytes"
+    digest = hashlib.sha256(data).hexdigest()
+    upload = tmp_path / f"{digest}.mp4"
+    upload.write_bytes(data)
+    other_name = tmp_path / "clip.mov"
+    other_name.write_bytes(data)
+    graph = compile_prompt("vintage sharpen")
+    monkeypatch.setattr(settings, "VIDEO_SPEED_PROFILE", "balanced")
+
+    key = video_store.cache_key(str(upload), graph)
+    assert key == video_store.cache_key(str(upload), compile_prompt("vintage sharpen"))
+    # Uploads are keyed by the digest in their name, anything else by its content
+    assert key == video_store.cache_key(str(other_name), graph)
+    assert key != video_store.cache_key(str(upload), compile_prompt("vintage"))
+
+    # Different encoder settings make a different output
+    monkeypatch.setattr(settings, "VIDEO_SPEED_PROFILE", "quality")
+    assert key != video_store.cache_key(str(upload), graph)
+
+def test_expire_partials(video_dirs):
+    orphan = write(video_dirs / f"a.job1{video_store.PARTIAL_SUFFIX}", age=120)
+    active = write(video_dirs / f"b.job2{video_store.PARTIAL_SUFFIX}", age=120)
+    fresh = write(video_dirs / f"c.job3{video_store.PARTIAL_SUFFIX}", age=5)
+    finished = write(video_dirs / "d.mp4", age=120)
+
+    assert video_store.expire_partials({active}) == 100
+    assert not os.path.exists(orphan)
+    assert all(os.path.exists(path) for path in (active, fresh, finished))
+
+def test_only_uploads_in_use_survive_the_quota(video_dirs, monkeypatch):
+    uploads = video_dirs / "uploads"
+    hour = 3600
+    idle = write(uploads / "idle.mp4", age=5 * hour)
+    job_input = write(uploads / "job.mp4", age=6 * hour)
+    previewing = write(uploads / "preview.mp4", age=7 * hour)
+    recent = write(uploads / "recent.mp4", age=60 * 5)
+    monkeypatch.setitem(video_service.previewing, previewing, 1)
+    monkeypatch.setattr(settings, "VIDEO_UPLOAD_QUOTA_BYTES", 1)
+    monkeypatch.setattr(settings, "VIDEO_UPLOAD_GRACE", 900.0)
+
+    assert video_store.enforce_quota({job_input}, set()) == 100
+    assert sorted(os.listdir(uploads)) == ["job.mp4", "preview.mp4", "recent.mp4"]
+
+    # Once the job and preview are done, their uploads can go as well
+    video_service.previewing.clear()
+    assert video_store.enforce_quota(set(), set()) == 200
+    assert os.listdir(uploads) == ["recent.mp4"]
+
+def test_quota_evicts_lru_outputs_and_expires_their_rows(video_dirs, monkeypatch):
+    expired = []
+
+    class Session:
+        def execute(self, statement):
+            expired.append(statement.compile().params["output_file_1"])
+
+        def commit(self):
+            pass
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(video_store, "SessionLocal", Session)
+    write(video_dirs / "old.mp4", age=300)
+    write(video_dirs / "new.mp4", age=200)
+    write(video_dirs / f"running.job{video_store.PARTIAL_SUFFIX}", age=400)
+    monkeypatch.setattr(settings, "VIDEO_OUTPUT_QUOTA_BYTES", 250)
+
+    running = str(video_dirs / f"running.job{video_store.PARTIAL_SUFFIX}")
+    assert video_store.enforce_quota(set(), {running}) == 100
+    assert sorted(os.listdir(video_dirs)) == ["new.mp4", "previews", f"running.job{video_store.PARTIAL_SUFFIX}", "uploads"]
+    assert expired == ["/static/videos/old.mp4"]